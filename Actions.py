@@ -1,28 +1,45 @@
 import datetime
-import json
 import logging
 import os
-import traceback
-import xml.etree.ElementTree as ET
+import re
 
-import requests
-from bs4 import BeautifulSoup
-from decos import log
+import charset
+import fetch
+import hotpepper
+import jsonp
+import metrics
+import qiita
+from decos import instrument, source
 
 LOGGER = logging.getLogger(name="Lambda")
 
-# 日本時間に調整
-NOW = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=9)
-# 1日と3分前を前日とする
-YESTERDAY = NOW - datetime.timedelta(days=1) - datetime.timedelta(minutes=3)
-YESTERDAY = datetime.datetime(
-    YESTERDAY.year,
-    YESTERDAY.month,
-    YESTERDAY.day,
-    YESTERDAY.hour,
-    YESTERDAY.minute,
-    YESTERDAY.second,
-)
+
+def clock() -> tuple[datetime.datetime, datetime.datetime]:
+    """日本時間の現在時刻と、前日とする時刻を返す."""
+    # 日本時間に調整
+    now = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=9)
+    # 1日と3分前を前日とする
+    yesterday = now - datetime.timedelta(days=1) - datetime.timedelta(minutes=3)
+    yesterday = datetime.datetime(
+        yesterday.year,
+        yesterday.month,
+        yesterday.day,
+        yesterday.hour,
+        yesterday.minute,
+        yesterday.second,
+    )
+    return now, yesterday
+
+
+NOW, YESTERDAY = clock()
+
+
+def reset_clock() -> None:
+    """NOW と YESTERDAY を今の時刻で計算し直す(温まったコンテナで繰り返し取得する場合に使う)."""
+    global NOW, YESTERDAY
+    NOW, YESTERDAY = clock()
+
+
 HEADER = {
     "User-agent": """\
 Mozilla/5.0 (Windows NT 10.0; Win64; x64) \
@@ -30,6 +47,97 @@ AppleWebKit/537.36 (KHTML, like Gecko) Chrome/79.0.3945.88 Safari/537.36"""
 }
 
 
+# ソースごとのレスポンスの上限(バイト)
+MAX_BYTES = {
+    "rss": 1024 * 1024,
+    "aitRanking": 512 * 1024,
+    "jpcert": 1024 * 1024,
+    "hotpepper": 2 * 1024 * 1024,
+    "qiita": 512 * 1024,
+}
+
+
+def source_name() -> str | None:
+    """実行中のソース名(文字コードの判定結果のキャッシュに使う)."""
+    call = metrics.current()
+    return call.source if call is not None else None
+
+
+def stream_xml(url: str, max_bytes: int, hint: str = "utf-8"):
+    """GETした XML の本文を、文字コードを判定して UTF-8 の chunk ごとに返す(charset.iter_xml)."""
+    res = fetch.get(url, stream=True, headers=HEADER)
+    return charset.iter_xml(fetch.iter_body(res, max_bytes), res.headers.get("Content-Type"), source_name(), hint)
+
+
+def read_text(url: str, max_bytes: int, hint: str = "utf-8") -> str:
+    """GETした本文を、文字コードを判定して文字列で返す."""
+    res, body = fetch.read_response(url, max_bytes, headers=HEADER)
+    return charset.decode(body, res.headers.get("Content-Type"), source_name(), hint)
+
+
+def iter_items(chunks, depth: int):
+    """XMLを chunk ごとに解析し、depth の深さ(ルートが0)にある item 要素を順に返す.
+
+    返した要素は次の要素に進むときに中身を捨てるので、フィード全体をメモリに持たない。
+    返した要素の数は実行中のソースの items_in に数える。
+    xml.etree はRSSを扱うときだけ必要なので、ここで import する。
+    """
+    import xml.etree.ElementTree as ET
+
+    parser = ET.XMLPullParser(events=("start", "end"))
+    level = 0
+
+    def items():
+        nonlocal level
+        for event, elem in parser.read_events():
+            if event == "start":
+                level += 1
+                continue
+            level -= 1
+            if level == depth and "item" in elem.tag.lower():
+                yield elem
+                elem.clear()
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from metrics.counted(items())
+    parser.close()
+    yield from metrics.counted(items())
+
+
+# JPCERTのトップページで使う部分(見出しごとの div.container)
+JPCERT_CONTAINER = ("div", "container")
+
+
+def parse_html(text: str, only: tuple[str, str] | None = None):
+    """HTMLを解析する.
+
+    bs4 (soupsieve を含む) は import が重く、JPCERTのときだけ必要なので、ここで import する。
+    only に (タグ名, class) を指定すると、その要素の中だけ木を作る(bs4.SoupStrainer)。
+    ヘッダーのメニューなどのノードは作らない。
+    """
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    if only is None:
+        return BeautifulSoup(text, "html.parser")
+    name, class_ = only
+    # 解析中の class は空白区切りの文字列のままなので、class が複数ある要素にも合うよう正規表現で探す
+    classes = re.compile(rf"(?:^|\s){re.escape(class_)}(?:\s|$)")
+    return BeautifulSoup(text, "html.parser", parse_only=SoupStrainer(name, class_=classes))
+
+
+def jpcert_section(url: str, heading: str):
+    """JPCERTのトップページから、見出し(h3)が heading の div.container を返す. なければ None."""
+    import css
+
+    page = parse_html(read_text(url, MAX_BYTES["jpcert"]), JPCERT_CONTAINER)
+    for container in css.CONTAINER.iselect(page):
+        h3 = css.HEADING.select_one(container)
+        if h3 is not None and h3.text == heading:
+            return container
+    return None
+
+
 def get_text(item, tag_name: str) -> str:
     """XMLのタグ名を基に文字列を取得.
 
@@ -42,13 +150,17 @@ def get_text(item, tag_name: str) -> str:
 
 
 class Actions:
+    """返信と定期実行で使うソース.
+
+    ヘルプ(メソッド一覧)に表示する説明は ReplyAction.ITEM に書く。
+    """
+
     @classmethod
-    @log(LOGGER)
+    @instrument(LOGGER)
+    @source
     async def aitNewAll(cls, *_) -> list:
         """アットマークITの全フォーラムの新着記事.
 
-        アットマークITの全フォーラムの新着記事を取得します。
-
         Returns:
             list: 辞書を格納した配列を返す。エラー発生時、Noneを返す
             [
@@ -58,33 +170,26 @@ class Actions:
         url = "https://rss.itmedia.co.jp/rss/2.0/ait.xml"
         LOGGER.debug(f"GET {url} header: {HEADER}")
         contents = []
-        try:
-            res = requests.get(url, headers=HEADER)
-            root = ET.fromstring(res.content.decode("utf8"))
-            for child in root[0]:
-                if "item" in child.tag.lower():
-                    if get_text(child, "title").startswith("PR:"):
-                        continue
-                    if get_text(child, "title").startswith("PR： "):
-                        continue
-                    pub_date = datetime.datetime.strptime(get_text(child, "pubdate")[0:25], "%a, %d %b %Y %H:%M:%S")
-                    if YESTERDAY <= pub_date:
-                        content = {
-                            "title": get_text(child, "title"),
-                            "link": get_text(child, "link"),
-                        }
-                        contents.append(content)
-        except Exception:
-            LOGGER.error(f"{traceback.format_exc()}")
+        for child in iter_items(stream_xml(url, MAX_BYTES["rss"]), 2):
+            if get_text(child, "title").startswith("PR:"):
+                continue
+            if get_text(child, "title").startswith("PR： "):
+                continue
+            pub_date = datetime.datetime.strptime(get_text(child, "pubdate")[0:25], "%a, %d %b %Y %H:%M:%S")
+            if YESTERDAY <= pub_date:
+                content = {
+                    "title": get_text(child, "title"),
+                    "link": get_text(child, "link"),
+                }
+                contents.append(content)
         return contents
 
     @classmethod
-    @log(LOGGER)
+    @instrument(LOGGER)
+    @source
     async def aitRanking(cls, *_) -> list:
         """アットマークITの本日の総合ランキング.
 
-        アットマークITの本日の総合ランキングを取得します。
-
         Returns:
             list: 辞書を格納した配列を返す。エラー発生時、Noneを返す
             [
@@ -94,30 +199,26 @@ class Actions:
         url = "https://www.atmarkit.co.jp/json/ait/rss_rankindex_all_day.json"
         LOGGER.debug(f"GET {url} header: {HEADER}")
         contents = []
-        try:
-            res = requests.get(url, headers=HEADER)
-            json_str = res.content.decode("sjis").replace("rankingindex(", "").replace(")", "").replace("'", '"')
-            json_data = json.loads(json_str)
-            for item in json_data["data"]:
-                if len(contents) >= 10:
-                    break
-                if item:
-                    content = {
-                        "title": item["title"].replace(" ", ""),
-                        "link": item["link"],
-                    }
-                    contents.append(content)
-        except Exception:
-            LOGGER.error(f"{traceback.format_exc()}")
+        res, body = fetch.read_response(url, MAX_BYTES["aitRanking"], headers=HEADER)
+        json_data = jsonp.parse(body, charset.resolve(body, res.headers.get("Content-Type"), source_name(), "sjis"))
+        metrics.received(len(json_data["data"]))
+        for item in json_data["data"]:
+            if len(contents) >= 10:
+                break
+            if item:
+                content = {
+                    "title": item["title"].replace(" ", ""),
+                    "link": item["link"],
+                }
+                contents.append(content)
         return contents
 
     @classmethod
-    @log(LOGGER)
+    @instrument(LOGGER)
+    @source
     async def itmediaNews(cls, *_) -> list:
         """ITmedia NEWS 最新記事一覧.
 
-        ITmedia NEWSの最新記事一覧を取得します。
-
         Returns:
             list: 辞書を格納した配列を返す。エラー発生時、Noneを返す
             [
@@ -127,29 +228,22 @@ class Actions:
         url = "https://rss.itmedia.co.jp/rss/2.0/news_bursts.xml"
         LOGGER.debug(f"GET {url} header: {HEADER}")
         contents = []
-        try:
-            res = requests.get(url, headers=HEADER)
-            root = ET.fromstring(res.content.decode("utf8"))
-            for child in root[0]:
-                if "item" in child.tag.lower():
-                    pub_date = datetime.datetime.strptime(get_text(child, "pubdate")[0:25], "%a, %d %b %Y %H:%M:%S")
-                    if YESTERDAY <= pub_date:
-                        content = {
-                            "title": get_text(child, "title"),
-                            "link": get_text(child, "link"),
-                        }
-                        contents.append(content)
-        except Exception:
-            LOGGER.error(f"{traceback.format_exc()}")
+        for child in iter_items(stream_xml(url, MAX_BYTES["rss"]), 2):
+            pub_date = datetime.datetime.strptime(get_text(child, "pubdate")[0:25], "%a, %d %b %Y %H:%M:%S")
+            if YESTERDAY <= pub_date:
+                content = {
+                    "title": get_text(child, "title"),
+                    "link": get_text(child, "link"),
+                }
+                contents.append(content)
         return contents
 
     @classmethod
-    @log(LOGGER)
+    @instrument(LOGGER)
+    @source
     async def techTarget(cls, *_) -> list:
         """TechTarget Japanの最新記事一覧.
 
-        TechTarget Japanの最新記事一覧を取得します。
-
         Returns:
             list: 辞書を格納した配列を返す。エラー発生時、Noneを返す
             [
@@ -159,30 +253,23 @@ class Actions:
         url = "https://rss.itmedia.co.jp/rss/2.0/techtarget.xml"
         LOGGER.debug(f"GET {url} header: {HEADER}")
         contents = []
-        try:
-            res = requests.get(url, headers=HEADER)
-            root = ET.fromstring(res.content.decode("utf8"))
-            for child in root[0]:
-                if "item" in child.tag.lower():
-                    pub_date = datetime.datetime.strptime(get_text(child, "pubdate")[0:25], "%a, %d %b %Y %H:%M:%S")
-                    title = get_text(child, "title")
-                    if YESTERDAY <= pub_date and not title.startswith("PR："):
-                        content = {
-                            "title": title,
-                            "link": get_text(child, "link"),
-                        }
-                        contents.append(content)
-        except Exception:
-            LOGGER.error(f"{traceback.format_exc()}")
+        for child in iter_items(stream_xml(url, MAX_BYTES["rss"]), 2):
+            pub_date = datetime.datetime.strptime(get_text(child, "pubdate")[0:25], "%a, %d %b %Y %H:%M:%S")
+            title = get_text(child, "title")
+            if YESTERDAY <= pub_date and not title.startswith("PR："):
+                content = {
+                    "title": title,
+                    "link": get_text(child, "link"),
+                }
+                contents.append(content)
         return contents
 
     @classmethod
-    @log(LOGGER)
+    @instrument(LOGGER)
+    @source
     async def jpcertAlert(cls, *_) -> list:
         """脆弱性関連情報.
 
-        JPCERTで当日発表された脆弱性関連情報を取得します。
-
         Returns:
             list: 辞書を格納した配列を返す。エラー発生時、Noneを返す
             [
@@ -191,34 +278,29 @@ class Actions:
         """
         url = "https://www.jpcert.or.jp"
         contents = []
-        try:
-            ret = requests.get(url, headers=HEADER)
-            jpcert = BeautifulSoup(ret.content.decode("utf-8"), "html.parser")
-            items = jpcert.select("div.container")
-            for data in items:
-                if data.select("h3") and data.select("h3")[0].text == "脆弱性関連情報":
-                    for li in data.select("ul.list>li"):
-                        published = li.select("a")[0].select("span.left_area")[0].text.strip()
-                        dt_published = datetime.datetime.strptime(published, "%Y-%m-%d %H:%M")
-                        title = li.select("a")[0].select("span.right_area")[0].text
-                        if YESTERDAY <= dt_published:
-                            link = li.select("a")[0].get("href")
-                            content = {
-                                "title": title,
-                                "link": link,
-                            }
-                            contents.append(content)
-        except Exception:
-            LOGGER.error(f"{traceback.format_exc()}")
+        import css
+
+        section = jpcert_section(url, "脆弱性関連情報")
+        for li in metrics.counted(css.LIST_ITEM.iselect(section) if section is not None else []):
+            a = li.find("a")
+            published = css.PUBLISHED.select_one(a).text.strip()
+            dt_published = datetime.datetime.strptime(published, "%Y-%m-%d %H:%M")
+            title = css.TITLE.select_one(a).text
+            if YESTERDAY <= dt_published:
+                link = a.get("href")
+                content = {
+                    "title": title,
+                    "link": link,
+                }
+                contents.append(content)
         return contents
 
     @classmethod
-    @log(LOGGER)
+    @instrument(LOGGER)
+    @source
     async def jpcertNotice(cls, *_) -> dict:
         """注意喚起.
 
-        JPCERTで当日発表された注意喚起を取得します。
-
         Returns:
             list: 辞書を格納した配列を返す。エラー発生時、Noneを返す
             [
@@ -228,40 +310,38 @@ class Actions:
         url = "https://www.jpcert.or.jp"
         today = NOW.strftime("%Y-%m-%d")
         contents = []
-        try:
-            ret = requests.get(url, headers=HEADER)
-            jpcert = BeautifulSoup(ret.content.decode("utf-8"), "html.parser")
-            items = jpcert.select("div.container")
-            for data in items:
-                if data.select("h3") and data.select("h3")[0].text == "注意喚起":
-                    for li in data.select("ul.list>li"):
-                        published = li.select("a")[0].select("span.left_area")[0].text
-                        title = li.select("a")[0].select("span.right_area")[0].text
-                        if today in published:
-                            link = url + li.select("a")[0].get("href")
-                            content = {
-                                "title": f"{today} {title}",
-                                "link": link,
-                            }
-                            contents.append(content)
-                        if YESTERDAY.strftime("%Y-%m-%d") in published:
-                            link = url + li.select("a")[0].get("href")
-                            content = {
-                                "title": f"{YESTERDAY.strftime('%Y-%m-%d')} {title}",
-                                "link": link,
-                            }
-                            contents.append(content)
-        except Exception:
-            LOGGER.error(f"{traceback.format_exc()}")
+        import css
+
+        section = jpcert_section(url, "注意喚起")
+        for li in metrics.counted(css.LIST_ITEM.iselect(section) if section is not None else []):
+            a = li.find("a")
+            published = css.PUBLISHED.select_one(a).text
+            title = css.TITLE.select_one(a).text
+            if today in published:
+                link = url + a.get("href")
+                content = {
+                    "title": f"{today} {title}",
+                    "link": link,
+                }
+                contents.append(content)
+            if YESTERDAY.strftime("%Y-%m-%d") in published:
+                link = url + a.get("href")
+                content = {
+                    "title": f"{YESTERDAY.strftime('%Y-%m-%d')} {title}",
+                    "link": link,
+                }
+                contents.append(content)
         return contents
 
     @classmethod
-    @log(LOGGER)
+    @instrument(LOGGER)
+    @source
     async def lunch(cls, args: list) -> list:
         """ランチ営業店舗検索.
 
-        スペース区切りもしくは改行区切りで二つ以上キーワードを入力すると場所での検索も可能です。
-        一つの場合はデフォルト座標付近での検索となります。
+        Args:
+            args (list): キーワード。位置情報(@<緯度>,<経度>)があればその付近を近い順に、
+                先頭が「次へ <ページ>」ならそのページを返す(続きがあれば最後に「次へ」のポストバックを付ける)
 
         Returns:
             list: 辞書を格納した配列を返す。エラー発生時、Noneを返す
@@ -269,6 +349,8 @@ class Actions:
                 {'title': '<記事のタイトル>', 'link': '<記事のリンク>'}, ...
             ]
         """
+        query, page = hotpepper.page_number(args)
+        args, location = hotpepper.location(query)
         _param = {
             "key": os.environ.get("hotpepper"),
             "large_service_area": "SS10",  # 関東
@@ -279,40 +361,37 @@ class Actions:
             "count": "100",
             "lunch": "1",
         }
-        if not args or len(args) == 1:
+        if location:
+            _param["lat"], _param["lng"] = location
+            # 位置情報の場合は距離順
+            del _param["order"]
+        elif not args or len(args) == 1:
             _param["lat"] = os.environ["default_lat"]
             _param["lng"] = os.environ["default_lng"]
         if len(args) > 0:
             _param["keyword"] = " ".join(list(args))
-        hotpepper = requests.get(
-            "http://webservice.recruit.co.jp/hotpepper/gourmet/v1/",
-            params=_param,
-            headers=HEADER,
-        )
-        contents = []
-        shops = hotpepper.json()["results"]["shop"]
-        if len(shops) > 0:
-            for shop in shops:
-                content = {
-                    "title": shop["name"],
-                    "link": shop["urls"]["pc"],
-                }
-                contents.append(content)
+        if location:
+            shops = hotpepper.nearby(_param, MAX_BYTES["hotpepper"], HEADER)
         else:
-            content = {
-                "title": "検索結果がありません",
-                "link": None,
-            }
-            contents.append(content)
-        return contents
+            shops = hotpepper.search(_param, MAX_BYTES["hotpepper"], HEADER)
+        metrics.received(len(shops))
+        if len(shops) > 0:
+            return hotpepper.paginate(shops, page, "ランチ検索", query)
+        content = {
+            "title": "検索結果がありません",
+            "link": None,
+        }
+        return [content]
 
     @classmethod
-    @log(LOGGER)
+    @instrument(LOGGER)
+    @source
     async def nomitai(cls, args: list) -> list:
         """居酒屋検索.
 
-        スペース区切りもしくは改行区切りで二つ以上キーワードを入力すると場所での検索も可能です。
-        一つの場合はデフォルト座標付近での検索となります。
+        Args:
+            args (list): キーワード。位置情報(@<緯度>,<経度>)があればその付近を近い順に、
+                先頭が「次へ <ページ>」ならそのページを返す(続きがあれば最後に「次へ」のポストバックを付ける)
 
         Returns:
             list: 辞書を格納した配列を返す。エラー発生時、Noneを返す
@@ -320,6 +399,8 @@ class Actions:
                 {'title': '<記事のタイトル>', 'link': '<記事のリンク>'}, ...
             ]
         """
+        query, page = hotpepper.page_number(args)
+        args, location = hotpepper.location(query)
         _param = {
             "key": os.environ.get("hotpepper"),
             "large_service_area": "SS10",  # 関東
@@ -329,55 +410,49 @@ class Actions:
             "format": "json",
             "count": "100",
         }
-        if not args or len(args) == 1:
+        if location:
+            _param["lat"], _param["lng"] = location
+            # 位置情報の場合は距離順
+            del _param["order"]
+        elif not args or len(args) == 1:
             _param["lat"] = os.environ["default_lat"]
             _param["lng"] = os.environ["default_lng"]
-            if not args:
-                # デフォルトは居酒屋
-                _param["genre"] = "G001"
+        if not args:
+            # デフォルトは居酒屋
+            _param["genre"] = "G001"
         if len(args) > 0:
             _param["keyword"] = " ".join(list(args))
         if len(args) >= 2:
             # 範囲を絞る
             _param["range"] = 3
 
-        hotpepper = requests.get(
-            "http://webservice.recruit.co.jp/hotpepper/gourmet/v1/",
-            params=_param,
-            headers=HEADER,
-        )
-        contents = []
-        shops = hotpepper.json()["results"]["shop"]
-        if len(shops) > 0:
-            for shop in shops:
-                content = {
-                    "title": shop["name"],
-                    "link": shop["urls"]["pc"],
-                }
-                contents.append(content)
+        if location:
+            shops = hotpepper.nearby(_param, MAX_BYTES["hotpepper"], HEADER)
         else:
-            content = {
-                "title": "検索結果がありません",
-                "link": None,
-            }
-            contents.append(content)
-        return contents
+            shops = hotpepper.search(_param, MAX_BYTES["hotpepper"], HEADER)
+        metrics.received(len(shops))
+        if len(shops) > 0:
+            return hotpepper.paginate(shops, page, "居酒屋検索", query)
+        content = {
+            "title": "検索結果がありません",
+            "link": None,
+        }
+        return [content]
 
     @classmethod
-    @log(LOGGER)
+    @instrument(LOGGER)
+    @source
     async def qiita(cls, *_) -> list:
         """Qiita新着記事取得.
 
-        Qiitaの新着記事を3件取得します。
-
         Returns:
             list: 辞書を格納した配列を返す。エラー発生時、Noneを返す
             [
                 {'title': '<記事のタイトル>', 'link': '<記事のリンク>'}, ...
             ]
         """
-        res = requests.get("https://qiita.com/api/v2/items?page=1&per_page=3", headers=HEADER)
-        data = res.json()
+        data = qiita.items(3, MAX_BYTES["qiita"], HEADER)
+        metrics.received(len(data))
         contents = []
         for d in data:
             content = {
@@ -388,12 +463,11 @@ class Actions:
         return contents
 
     @classmethod
-    @log(LOGGER)
+    @instrument(LOGGER)
+    @source
     async def smartJp(cls, *_) -> list:
         """スマートジャパンの新着記事.
 
-        スマートジャパンの新着記事を取得します。
-
         Returns:
             list: 辞書を格納した配列を返す。エラー発生時、Noneを返す
             [
@@ -403,33 +477,26 @@ class Actions:
         url = "https://rss.itmedia.co.jp/rss/2.0/smartjapan.xml"
         LOGGER.debug(f"GET {url} header: {HEADER}")
         contents = []
-        try:
-            res = requests.get(url, headers=HEADER)
-            root = ET.fromstring(res.content.decode("utf8"))
-            for child in root[0]:
-                if "item" in child.tag.lower():
-                    if get_text(child, "title").startswith("PR:"):
-                        continue
-                    if get_text(child, "title").startswith("PR： "):
-                        continue
-                    pub_date = datetime.datetime.strptime(get_text(child, "pubdate")[0:25], "%a, %d %b %Y %H:%M:%S")
-                    if YESTERDAY <= pub_date:
-                        content = {
-                            "title": get_text(child, "title"),
-                            "link": get_text(child, "link"),
-                        }
-                        contents.append(content)
-        except Exception:
-            LOGGER.error(f"{traceback.format_exc()}")
+        for child in iter_items(stream_xml(url, MAX_BYTES["rss"]), 2):
+            if get_text(child, "title").startswith("PR:"):
+                continue
+            if get_text(child, "title").startswith("PR： "):
+                continue
+            pub_date = datetime.datetime.strptime(get_text(child, "pubdate")[0:25], "%a, %d %b %Y %H:%M:%S")
+            if YESTERDAY <= pub_date:
+                content = {
+                    "title": get_text(child, "title"),
+                    "link": get_text(child, "link"),
+                }
+                contents.append(content)
         return contents
 
     @classmethod
-    @log(LOGGER)
+    @instrument(LOGGER)
+    @source
     async def uxmilk(cls, *_) -> list:
         """UX MILKのニュース一覧.
 
-        UX MILKからニュースを取得します。
-
         Returns:
             list: 辞書を格納した配列を返す。エラー発生時、Noneを返す
             [
@@ -439,30 +506,22 @@ class Actions:
         url = "https://uxmilk.jp/feed"
         LOGGER.debug(f"GET {url} header: {HEADER}")
         contents = []
-        try:
-            res = requests.get(url, headers=HEADER)
-            root = ET.fromstring(res.content.decode("utf8"))
-            for child in root[0]:
-                if "item" in child.tag.lower():
-                    pub_date = datetime.datetime.strptime(get_text(child, "pubdate")[0:25], "%a, %d %b %Y %H:%M:%S")
-                    if YESTERDAY <= pub_date:
-                        content = {
-                            "title": get_text(child, "title"),
-                            "link": get_text(child, "link"),
-                        }
-                        contents.append(content)
-        except Exception:
-            LOGGER.error(f"{traceback.format_exc()}")
+        for child in iter_items(stream_xml(url, MAX_BYTES["rss"]), 2):
+            pub_date = datetime.datetime.strptime(get_text(child, "pubdate")[0:25], "%a, %d %b %Y %H:%M:%S")
+            if YESTERDAY <= pub_date:
+                content = {
+                    "title": get_text(child, "title"),
+                    "link": get_text(child, "link"),
+                }
+                contents.append(content)
         return contents
 
     @classmethod
-    @log(LOGGER)
+    @instrument(LOGGER)
+    @source
     async def weeklyReport(cls, *_) -> list:
         """JPCERT Weekly Report.
 
-        JPCERT から Weekly Report を取得します。
-        水曜日とかじゃないと何も返ってきません。
-
         Returns:
             list: 辞書を格納した配列を返す。エラー発生時、Noneを返す
             [
@@ -472,29 +531,30 @@ class Actions:
         url = "https://www.jpcert.or.jp"
         today = NOW.strftime("%Y-%m-%d")
         contents = []
-        try:
-            ret = requests.get(url, headers=HEADER)
-            jpcert = BeautifulSoup(ret.content.decode("utf-8"), "html.parser")
-            whatsdate = jpcert.select("a.fl")[0].text.replace("号", "")
-            if today == whatsdate:
-                wkrp = jpcert.select("div.contents")[0].select("li")
-                for i, item in enumerate(wkrp, start=1):
-                    content = {
-                        "title": f"{i}. {item.text}",
-                        "link": f"{url}{jpcert.select('a.fl')[0].get('href')}#{i}",
-                    }
-                    contents.append(content)
-        except Exception:
-            LOGGER.error(f"{traceback.format_exc()}")
+        import css
+
+        # a.fl と div.contents がどの枠にあるかはページの作りしだいなので、ページ全体を解析する
+        jpcert = parse_html(read_text(url, MAX_BYTES["jpcert"]))
+        fl = css.WEEKLY_REPORT.select_one(jpcert)
+        whatsdate = fl.text.replace("号", "")
+        if today == whatsdate:
+            # 目次は最初の div.contents の中だけ
+            wkrp = css.ITEM.select(css.WEEKLY_CONTENTS.select_one(jpcert))
+            metrics.received(len(wkrp))
+            for i, item in enumerate(wkrp, start=1):
+                content = {
+                    "title": f"{i}. {item.text}",
+                    "link": f"{url}{fl.get('href')}#{i}",
+                }
+                contents.append(content)
         return contents
 
     @classmethod
-    @log(LOGGER)
+    @instrument(LOGGER)
+    @source
     async def zdjapan(cls, *_) -> list:
         """ZDNet Japan 最新情報 総合.
 
-        ZDNet Japanから最新情報を取得します。
-
         Returns:
             list: 辞書を格納した配列を返す。エラー発生時、Noneを返す
             [
@@ -504,18 +564,12 @@ class Actions:
         url = "http://feeds.japan.zdnet.com/rss/zdnet/all.rdf"
         LOGGER.debug(f"GET {url} header: {HEADER}")
         contents = []
-        try:
-            res = requests.get(url, headers=HEADER)
-            root = ET.fromstring(res.content.decode("utf8"))
-            for child in root:
-                if "item" in child.tag.lower():
-                    pub_date = datetime.datetime.strptime(get_text(child, "date")[0:19], "%Y-%m-%dT%H:%M:%S")
-                    if YESTERDAY <= pub_date:
-                        content = {
-                            "title": get_text(child, "title"),
-                            "link": get_text(child, "link"),
-                        }
-                        contents.append(content)
-        except Exception:
-            LOGGER.error(f"{traceback.format_exc()}")
+        for child in iter_items(stream_xml(url, MAX_BYTES["rss"]), 1):
+            pub_date = datetime.datetime.strptime(get_text(child, "date")[0:19], "%Y-%m-%dT%H:%M:%S")
+            if YESTERDAY <= pub_date:
+                content = {
+                    "title": get_text(child, "title"),
+                    "link": get_text(child, "link"),
+                }
+                contents.append(content)
         return contents
@@ -18,10 +18,13 @@ import json
 import logging
 import os
 
-import requests
+import deadline
+import fetch
+import snapshot
 from Actions import Actions
-from decos import log
+from decos import instrument, sampled
 from message import create_content, create_header, create_message
+from tracing import traced
 
 # 配信メッセージとして許容するメソッド群
 ITEM: dict[str, dict[str, str | bool]] = {
@@ -71,9 +74,24 @@ ITEM: dict[str, dict[str, str | bool]] = {
     },
 }
 
+# 取得する順番(配信メッセージもこの順に並ぶ)
+SOURCES = [
+    "aitRanking",
+    "aitNewAll",
+    "itmediaNews",
+    "smartJp",
+    "uxmilk",
+    "zdjapan",
+    "techTarget",
+    "jpcertAlert",
+    "jpcertNotice",
+    "weeklyReport",
+]
+
 LOGGER = logging.getLogger(name="Lambda")
 
 
+@traced()
 def push(user_list: list, message: dict) -> None:
     """プッシュ通知する."""
     if not user_list:
@@ -84,12 +102,16 @@ def push(user_list: list, message: dict) -> None:
         "Authorization": f"Bearer {os.environ['access_token']}",
     }
     url = "https://api.line.me/v2/bot/message/multicast"
-    payload = {"to": user_list, "messages": [message]}
-    LOGGER.info(f"[REQUEST] param: {json.dumps(payload)}")
-    res = requests.post(url, data=json.dumps(payload).encode("utf-8"), headers=headers)
+    data = json.dumps({"to": user_list, "messages": [message]})
+    # 送信先のIDとメッセージ全体は、サンプリングしたときだけログに出す
+    LOGGER.info(f"[REQUEST] multicast to {len(user_list)} users, {len(data)} bytes")
+    if sampled():
+        LOGGER.info(f"[SAMPLED] push param: {data}")
+    res = fetch.post(url, data=data.encode("utf-8"), headers=headers)
     LOGGER.info(f"[RESPONSE] [STATUS]{res.status_code} [HEADER]{res.headers} [CONTENT]{res.content}")
 
 
+@traced()
 def build_contents(value: dict, data: list, name: str) -> list:
     """LINEの配信メッセージのbody部に挿入するための要素を生成する.
 
@@ -111,14 +133,27 @@ class CronAction:
     def __init__(self, dynamo):
         self.dynamo = dynamo
 
-    @log(LOGGER)
+    def users(self):
+        """users テーブルの項目を順に返す.
+
+        scan は1回に1MBまでしか返さないので、LastEvaluatedKey があれば続きを読む。
+        """
+        param = {"TableName": "users"}
+        while True:
+            res = self.dynamo.scan(**param)
+            yield from res["Items"]
+            if "LastEvaluatedKey" not in res:
+                return
+            param["ExclusiveStartKey"] = res["LastEvaluatedKey"]
+
+    @instrument(LOGGER)
     async def execute(self):
         """ユーザーごとにまとめて配信する."""
         user_settings = {}
 
-        for item in self.dynamo.scan(**{"TableName": "users"})["Items"]:
+        for item in self.users():
             # 配信を有効にしているユーザーの情報を取得
-            if item["enabled"]["BOOL"]:
+            if item.get("enabled", {}).get("BOOL", False):
                 user_settings[item["user_id"]["S"]] = {
                     "aitRanking": item.get("ait_enabled", {}).get("BOOL", False),
                     "aitNewAll": item.get("ait_new_all_enabled", {}).get("BOOL", False),
@@ -128,30 +163,19 @@ class CronAction:
                     "zdjapan": item.get("zdjapan_enabled", {}).get("BOOL", False),
                     "techTarget": item.get("techTarget", {}).get("BOOL", False),
                 }
-        aitRanking = await Actions.aitRanking()
-        aitNewAll = await Actions.aitNewAll()
-        itmediaNews = await Actions.itmediaNews()
-        smartJp = await Actions.smartJp()
-        uxmilk = await Actions.uxmilk()
-        zdjapan = await Actions.zdjapan()
-        techTarget = await Actions.techTarget()
-        jpcertAlert = await Actions.jpcertAlert()
-        jpcertNotice = await Actions.jpcertNotice()
-        weeklyReport = await Actions.weeklyReport()
+        # スナップショットがあればそれを使い、なければ取得する
+        # 取得するソースごとに残り時間を等分して割り当てる(早く終われば残りは後のソースに回る)
+        results = {name: snapshot.latest(name) for name in SOURCES}
+        pending = [name for name in SOURCES if results[name] is None]
+        for i, name in enumerate(pending):
+            with deadline.share(len(pending) - i):
+                results[name] = await getattr(Actions, name)()
 
         for user_id, value in user_settings.items():
             # ユーザーごとにコンテンツを生成し、配信
             contents = []
-            contents.extend(build_contents(value, aitRanking, "aitRanking"))
-            contents.extend(build_contents(value, aitNewAll, "aitNewAll"))
-            contents.extend(build_contents(value, itmediaNews, "itmediaNews"))
-            contents.extend(build_contents(value, smartJp, "smartJp"))
-            contents.extend(build_contents(value, uxmilk, "uxmilk"))
-            contents.extend(build_contents(value, zdjapan, "zdjapan"))
-            contents.extend(build_contents(value, techTarget, "techTarget"))
-            contents.extend(build_contents(value, jpcertAlert, "jpcertAlert"))
-            contents.extend(build_contents(value, jpcertNotice, "jpcertNotice"))
-            contents.extend(build_contents(value, weeklyReport, "weeklyReport"))
+            for name in SOURCES:
+                contents.extend(build_contents(value, results[name], name))
             header = create_header("定期実行", None)
             if len(contents) > 0:
                 push([user_id], create_message(header, contents, None))
@@ -1,50 +1,94 @@
 """応答メッセージをするメソッド群."""
 
+import functools
+import json
 import logging
 import os
-import re
+import traceback
 
+import settings
+import snapshot
 from Actions import Actions
-from decos import log
-from message import create_content, create_content2, create_footer, create_header, create_message
+from decos import instrument
+from message import (
+    create_content,
+    create_footer,
+    create_header,
+    create_help_content,
+    create_message,
+    create_postback_content,
+)
 
 # 応答メッセージとして許容するメソッド群
+# title と description があるものはヘルプ(メソッド一覧)に表示する
 ITEM = {
     "aitNewAll": {
         "name": "アットマークITの全フォーラムの新着記事",
         "must": ["アットマークIT", "新着"],
+        "title": "アットマークITの全フォーラムの新着記事",
+        "description": "アットマークITの全フォーラムの新着記事を取得します。",
     },
     "aitRanking": {
         "name": "アットマークITの本日の総合ランキング",
         "must": ["アットマークIT", "ランキング"],
+        "title": "アットマークITの本日の総合ランキング",
+        "description": "アットマークITの本日の総合ランキングを取得します。",
     },
     "itmediaNews": {
         "name": "ITmedia NEWS 最新記事一覧",
         "must": ["ITmedia", "最新"],
+        "title": "ITmedia NEWS 最新記事一覧",
+        "description": "ITmedia NEWSの最新記事一覧を取得します。",
     },
     "jpcertAlert": {
         "name": "脆弱性関連情報",
         "must": ["脆弱性"],
+        "title": "脆弱性関連情報",
+        "description": "JPCERTで当日発表された脆弱性関連情報を取得します。",
     },
     "jpcertNotice": {
         "name": "注意喚起",
         "must": ["注意喚起"],
+        "title": "注意喚起",
+        "description": "JPCERTで当日発表された注意喚起を取得します。",
     },
     "lunch": {
         "name": "ランチ検索",
         "must": ["ランチ", "検索"],
+        "title": "ランチ営業店舗検索",
+        "description": """\
+スペース区切りもしくは改行区切りで二つ以上キーワードを入力すると場所での検索も可能です。
+一つの場合はデフォルト座標付近での検索となります。
+位置情報を送ると、その付近をランチと居酒屋のどちらで検索するか選べます。
+10件ずつ表示し、「次へ」で続きを表示します。""",
     },
     "nomitai": {
         "name": "居酒屋検索",
         "must": ["居酒屋", "検索"],
+        "title": "居酒屋検索",
+        "description": """\
+スペース区切りもしくは改行区切りで二つ以上キーワードを入力すると場所での検索も可能です。
+一つの場合はデフォルト座標付近での検索となります。
+位置情報を送ると、その付近をランチと居酒屋のどちらで検索するか選べます。
+10件ずつ表示し、「次へ」で続きを表示します。""",
     },
     "qiita": {
         "name": "Qiitaの新着",
         "must": ["Qiita", "新着"],
+        "title": "Qiita新着記事取得",
+        "description": "Qiitaの新着記事を3件取得します。",
     },
     "smartJp": {
         "name": "スマートジャパンの新着記事",
         "must": ["スマートジャパン", "新着"],
+        "title": "スマートジャパンの新着記事",
+        "description": "スマートジャパンの新着記事を取得します。",
+    },
+    "techTarget": {
+        "name": "TechTarget Japanの最新記事一覧",
+        "must": ["Tech", "Target"],
+        "title": "TechTarget Japanの最新記事一覧",
+        "description": "TechTarget Japanの最新記事一覧を取得します。",
     },
     "techCrunchJapan": {
         "name": "Tech Crunch Japanのニュース一覧",
@@ -53,28 +97,70 @@ ITEM = {
     "uxmilk": {
         "name": "UX MILKのニュース一覧",
         "must": ["UX", "MILK", "ニュース"],
+        "title": "UX MILKのニュース一覧",
+        "description": "UX MILKからニュースを取得します。",
     },
     "weeklyReport": {
         "name": "JPCERT Weekly Report",
         "must": ["JPCERT", "Report"],
+        "title": "JPCERT Weekly Report",
+        "description": """\
+JPCERT から Weekly Report を取得します。
+水曜日とかじゃないと何も返ってきません。""",
     },
     "zdjapan": {
         "name": "ZDNet Japan 最新情報 総合",
         "must": ["ZDNet", "最新"],
+        "title": "ZDNet Japan 最新情報 総合",
+        "description": "ZDNet Japanから最新情報を取得します。",
     },
     "teiki": {
         "name": "定期実行確認",
         "must": ["定期", "確認"],
-    },
-    "techTarget": {
-        "name": "TechTarget Japanの最新記事一覧",
-        "must": ["Tech", "Target"],
+        "title": "定期実行",
+        "description": """\
+有効にしたら、毎日正午にニュース等を取得します。
+有効かどうかをチェックするには、このメソッドを実行してください。""",
     },
 }
 
 LOGGER = logging.getLogger(name="Lambda")
 
 
+@functools.cache
+def help_payload() -> str:
+    """ITEM からメソッド一覧のメッセージを作成し、JSONにシリアライズして返す."""
+    header = create_header("メソッド一覧", None)
+    contents = []
+    for value in ITEM.values():
+        if "description" in value:
+            contents.append(create_help_content(value["title"], value["description"], value["name"]))
+    return json.dumps(create_message(header, contents, None), ensure_ascii=False)
+
+
+def build_message(func_name: str, data: list) -> dict:
+    """Actions の取得結果から応答メッセージを作成する."""
+    contents = []
+    if data is None:
+        # エラーの場合
+        contents = [create_content("エラーが発生したため取得できませんでした", None)]
+    elif len(data) == 0:
+        # 検索結果なし
+        contents = [create_content("取得できるものがありませんでした", None)]
+    else:
+        for d in data:
+            if d.get("postback"):
+                content = create_postback_content(d["title"], d["postback"])
+            else:
+                content = create_content(d["title"], d["link"])
+            contents.append(content)
+    header = create_header(ITEM.get(func_name, {}).get("name"), None)
+    footer = None
+    if func_name in ["lunch", "nomitai"]:
+        footer = create_footer("Powered by ホットペッパー Webサービス")
+    return create_message(header, contents, footer)
+
+
 class ReplyAction:
     """やりたい処理を定義."""
 
@@ -89,92 +175,15 @@ AppleWebKit/537.36 (KHTML, like Gecko) Chrome/79.0.3945.88 Safari/537.36"""
         }
 
     @classmethod
-    @log(LOGGER)
-    def _help(cls):
-        """メソッド一覧."""
-        methods = [a for a in dir(Actions) if "_" not in a]
-        header = create_header("メソッド一覧", None)
-        contents = []
-        for _method in methods:
-            description = re.sub(" {1,}", "", getattr(Actions, _method).__doc__)
-            args = re.split(r"\.\n", description)
-            title = args[0]
-            # 末尾の改行も消している
-            description = "\n".join(("".join(args[1:])).split("\n")[1:]).rstrip()
-            # Returnsは不要
-            description = description.split("\n\n")[0]
-            label = ITEM.get(_method, {}).get("name", title)
-            content = {
-                "type": "box",
-                "layout": "vertical",
-                "paddingAll": "4px",
-                "contents": [
-                    {
-                        "type": "text",
-                        "text": title,
-                        "color": "#35393c",
-                        "wrap": True,
-                    },
-                    {
-                        "type": "text",
-                        "text": description,
-                        "size": "xs",
-                        "color": "#8C8C8C",
-                        "wrap": True,
-                    },
-                ],
-                "action": {
-                    "type": "postback",
-                    "label": label,
-                    "data": label,
-                    "displayText": label,
-                },
-                "flex": 0,
-            }
-            contents.append(content)
-        # 定期実行だけActionsではないので足す
-        description = re.sub(" {1,}", "", getattr(cls, "teiki").__doc__)
-        args = re.split(r"\.\n", description)
-        title = args[0]
-        # 末尾の改行も消している
-        description = "\n".join(("".join(args[1:])).split("\n")[1:]).rstrip()
-        # Returnsは不要
-        description = description.split("\n\n")[0]
-        label = ITEM.get("teiki", {}).get("name", title)
-        content = {
-            "type": "box",
-            "layout": "vertical",
-            "paddingAll": "4px",
-            "contents": [
-                {
-                    "type": "text",
-                    "text": title,
-                    "color": "#35393c",
-                    "wrap": True,
-                },
-                {
-                    "type": "text",
-                    "text": description,
-                    "size": "xs",
-                    "color": "#8C8C8C",
-                    "wrap": True,
-                },
-            ],
-            "action": {
-                "type": "postback",
-                "label": label,
-                "data": label,
-                "displayText": label,
-            },
-            "flex": 0,
-        }
-        contents.append(content)
-
-        message = create_message(header, contents, None)
+    @instrument(LOGGER)
+    def _help(cls) -> str:
+        """メソッド一覧.
 
-        return message
+        内容は変わらないので、最初の1回だけ作成してJSONにしたものを使い回す。
+        """
+        return help_payload()
 
-    @log(LOGGER)
+    @instrument(LOGGER)
     def _method_search(self, text):
         """対象のメソッドがあればそのメソッド名を返す."""
         for key, value in ITEM.items():
@@ -185,76 +194,30 @@ AppleWebKit/537.36 (KHTML, like Gecko) Chrome/79.0.3945.88 Safari/537.36"""
             if check == len(value["must"]):
                 return key
 
-    @log(LOGGER)
+    @instrument(LOGGER)
     async def executeAction(self, func_name: str, args: list) -> dict:
         """メソッドを実行して応答メッセージを作成して返す."""
         if func_name == "teiki":
             return self.teiki()
-        contents = []
-        data = await getattr(Actions, func_name)(args)
-        if data is None:
-            # エラーの場合
-            contents = [create_content("エラーが発生したため取得できませんでした", None)]
-        elif len(data) == 0:
-            # 検索結果なし
-            contents = [create_content("取得できるものがありませんでした", None)]
-        else:
-            for d in data:
-                content = create_content(d["title"], d["link"])
-                contents.append(content)
-        header = create_header(ITEM.get(func_name, {}).get("name"), None)
-        footer = None
-        if func_name in ["lunch", "nomitai"]:
-            footer = create_footer("Powered by ホットペッパー Webサービス")
-        return create_message(header, contents, footer)
+        # 定期的に取得済みの結果があれば、外部サイトを待たずに返す
+        data = snapshot.latest(func_name)
+        if data is not None:
+            return build_message(func_name, data)
+        try:
+            data = await getattr(Actions, func_name)(args)
+        except Exception:
+            # 予算切れなどで取得できなかった場合はエラーのメッセージを返す
+            LOGGER.error(traceback.format_exc())
+            data = None
+        return build_message(func_name, data)
 
-    @log(LOGGER)
-    def teiki(self) -> None:
+    @instrument(LOGGER)
+    def teiki(self) -> str:
         """定期実行.
 
         有効にしたら、毎日正午にニュース等を取得します。
         有効かどうかをチェックするには、このメソッドを実行してください。
+        設定画面は ON/OFF の組み合わせごとに作成済みのもの(settings.payload)を使う。
         """
-        header = create_header("定期実行の確認", None)
-        contents = []
-        for item in self.dynamo.scan(**{"TableName": "users"})["Items"]:
-            if item["user_id"]["S"] == self.user_id:
-                # 定期実行
-                is_enable = True if item.get("enabled", {}).get("BOOL", False) else False
-                postback = "定期無効" if is_enable else "定期有効"
-                contents.append(create_content2("定期実行", is_enable, postback))
-                # アットマークITランキング
-                is_enable = True if item.get("ait_enabled", {}).get("BOOL", False) else False
-                postback = "1無効" if is_enable else "1有効"
-                contents.append(create_content2("(1)アットマークITランキング", is_enable, postback))
-                # アットマークIT新着
-                is_enable = True if item.get("ait_new_all_enabled", {}).get("BOOL", False) else False
-                postback = "2無効" if is_enable else "2有効"
-                contents.append(create_content2("(2)アットマークITの全フォーラムの新着記事", is_enable, postback))
-                # スマートジャパン新着
-                is_enable = True if item.get("smart_jp_enabled", {}).get("BOOL", False) else False
-                postback = "3無効" if is_enable else "3有効"
-                contents.append(create_content2("(3)スマートジャパンの新着記事", is_enable, postback))
-                # ITmedia NEWS新着
-                is_enable = True if item.get("itmedia_news_enabled", {}).get("BOOL", False) else False
-                postback = "4無効" if is_enable else "4有効"
-                contents.append(create_content2("(4)ITmedia NEWS 最新記事一覧", is_enable, postback))
-                # ZDNet Japan新着
-                is_enable = True if item.get("zdjapan_enabled", {}).get("BOOL", False) else False
-                postback = "5無効" if is_enable else "5有効"
-                contents.append(create_content2("(5)ZDNet Japan 最新情報 総合", is_enable, postback))
-                # UX MILK新着
-                is_enable = True if item.get("uxmilk", {}).get("BOOL", False) else False
-                postback = "6無効" if is_enable else "6有効"
-                contents.append(create_content2("(6)UX MILK の最新ニュース", is_enable, postback))
-                # TechTarget Japan最新記事
-                is_enable = True if item.get("techTarget", {}).get("BOOL", False) else False
-                postback = "7無効" if is_enable else "7有効"
-                contents.append(create_content2("(7)TechTarget Japanの最新記事一覧", is_enable, postback))
-        footer = create_footer(
-            """\
-定期実行が無効の場合、有効なものがあってもプッシュ通知されません。
-定期実行が有効の場合、JPCERTの最新情報はオフにできません。
-タップすると有効・無効を切り替えます。"""
-        )
-        return create_message(header, contents, footer)
+        item = self.dynamo.get_item(TableName="users", Key={"user_id": {"S": self.user_id}}).get("Item")
+        return settings.payload(settings.states(item))
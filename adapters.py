@@ -0,0 +1,126 @@
+"""計測用のコネクションと予算の範囲で再試行する HTTPAdapter.
+
+requests と urllib3 を import するので、fetch.adapter_class から初めて通信するときに import する。
+"""
+
+import socket
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NameResolutionError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+from urllib3.util.retry import Retry
+
+import deadline
+import fetch
+import metrics
+
+
+class TimedConnectionMixin:
+    """名前解決と TCP 接続の時間を分けて計測する."""
+
+    new_conn_ms = 0.0
+
+    def _new_conn(self):
+        call = metrics.current()
+        if call is None:
+            return super()._new_conn()
+        started = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(self._dns_host, self.port, allowed_gai_family(), socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+        resolved = time.perf_counter()
+        call.dns_ms += (resolved - started) * 1000
+        # 名前解決済みのアドレスに順に接続する(SNI などに使う host はそのまま)
+        dns_host = self._dns_host
+        error = None
+        try:
+            for *_, sockaddr in addresses:
+                self._dns_host = sockaddr[0]
+                try:
+                    sock = super()._new_conn()
+                    break
+                except NewConnectionError as e:
+                    error = e
+            else:
+                raise error
+        finally:
+            self._dns_host = dns_host
+        call.connect_ms += (time.perf_counter() - resolved) * 1000
+        self.new_conn_ms = (time.perf_counter() - started) * 1000
+        return sock
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        call = metrics.current()
+        started = time.perf_counter()
+        self.new_conn_ms = 0.0
+        super().connect()
+        if call is not None:
+            call.tls_ms += max(0.0, (time.perf_counter() - started) * 1000 - self.new_conn_ms)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class DeadlineRetry(Retry):
+    """予算の範囲でだけ再試行し、再試行した回数を計測値に書き込む."""
+
+    def is_exhausted(self) -> bool:
+        if super().is_exhausted():
+            return True
+        left = deadline.remaining()
+        return left is not None and left < self.get_backoff_time() + deadline.MIN_REQUEST_SECONDS
+
+    def get_retry_after(self, response):
+        # Retry-After が予算より長ければ、予算の残りまでしか待たない
+        retry_after = super().get_retry_after(response)
+        left = deadline.remaining()
+        if retry_after is None or left is None:
+            return retry_after
+        return max(0.0, min(retry_after, left - deadline.MIN_REQUEST_SECONDS))
+
+    def increment(self, *args, **kwargs):
+        retry = super().increment(*args, **kwargs)
+        call = metrics.current()
+        if call is not None:
+            call.retries += 1
+        return retry
+
+
+class TimedAdapter(HTTPAdapter):
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault(
+            "max_retries",
+            DeadlineRetry(
+                total=fetch.RETRIES,
+                redirect=False,
+                status_forcelist=fetch.RETRY_STATUSES,
+                backoff_factor=fetch.BACKOFF_FACTOR,
+                backoff_jitter=fetch.BACKOFF_JITTER,
+                backoff_max=fetch.BACKOFF_MAX,
+                # 最後まで 5xx ならそのレスポンスを返す
+                raise_on_status=False,
+            ),
+        )
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
@@ -0,0 +1,47 @@
+"""coldstart.py から -X importtime 付きの新しいインタプリタで実行される.
+
+import の順番が計測結果に影響するので、lambda_function より前に余計なものを import しないこと。
+フェーズの区切りは標準エラーに "###phase <名前>" と書く(importtime の出力も標準エラーに出る)。
+"""
+
+import sys
+import time
+
+sys.stderr.write("###phase init\n")
+started = time.perf_counter()
+import lambda_function  # noqa: E402
+
+init_ms = (time.perf_counter() - started) * 1000
+sys.stderr.write("###phase setup\n")
+
+import json  # noqa: E402
+import os  # noqa: E402
+
+from benchmarks import fakes  # noqa: E402
+
+os.environ.setdefault("access_token", "bench-token")
+os.environ.setdefault("hotpepper", "bench-key")
+os.environ.setdefault("default_lat", "35.6812")
+os.environ.setdefault("default_lng", "139.7671")
+
+server = fakes.LocalServer().start()
+fakes.line_api(server)
+fakes.serve_fixtures(server)
+fakes.install_redirect(server)
+dynamo = fakes.FakeDynamo()
+lambda_function._DYNAMO = dynamo
+
+EVENTS = {
+    "follow": fakes.webhook_event(fakes.line_event("follow")),
+    "command": fakes.webhook_event(fakes.text_event("コマンド")),
+    "cron": fakes.CRON_EVENT,
+}
+handler_ms = {}
+for name, event in EVENTS.items():
+    sys.stderr.write(f"###phase {name}\n")
+    started = time.perf_counter()
+    lambda_function.lambda_handler(event, fakes.FakeContext())
+    handler_ms[name] = (time.perf_counter() - started) * 1000
+sys.stderr.write("###phase done\n")
+server.stop()
+print(json.dumps({"init_ms": init_ms, "handler_ms": handler_ms}))
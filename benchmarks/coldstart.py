@@ -0,0 +1,174 @@
+"""コールドスタートと import 時間の計測.
+
+新しいインタプリタを -X importtime 付きで起動し、lambda_function の import にかかる時間と、
+同梱しているパッケージごとの import 時間を計測する。
+続けて follow / コマンド / cron のイベントで lambda_handler を実行し、ハンドラの時間と
+そのときに発生した import を計測する。
+外部への通信とDynamoDBはすべてローカルのスタンドイン(benchmarks/fakes.py)に向ける。
+
+使い方:
+    python -m benchmarks.coldstart --repeat 5 --output coldstart.json
+    python -m benchmarks.coldstart --budget-ms 50   # 予算を超えたら終了コード1
+
+コミット間で結果の JSON を比較すれば、コールドスタートへの影響がわかる。
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+CHILD = Path(__file__).resolve().parent / "_coldstart_child.py"
+
+# 同梱しているパッケージ
+VENDORED = ["bs4", "soupsieve", "requests", "urllib3", "charset_normalizer", "idna", "certifi", "typing_extensions"]
+# コールドスタート時(lambda_function の import 時)に読み込まれてはいけないもの
+FORBIDDEN_AT_INIT = ["bs4", "soupsieve", "requests", "urllib3", "charset_normalizer", "boto3", "botocore"]
+
+IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse_importtime(stderr: str) -> dict:
+    """-X importtime の出力をフェーズごとに集計する.
+
+    Returns:
+        dict: フェーズ名をキーにした辞書
+        {
+            'init': {
+                'total_ms': 12.3,  # トップレベルの import の累積時間の合計
+                'modules': ['json', ...],
+                'packages': {'bs4': {'self_ms': 1.0, 'cumulative_ms': 20.0}, ...}
+            }, ...
+        }
+    """
+    phases: dict[str, dict] = {}
+    lines: dict[str, list] = {}
+    current = None
+    for line in stderr.splitlines():
+        if line.startswith("###phase "):
+            current = line.split(" ", 1)[1]
+            lines.setdefault(current, [])
+            continue
+        m = IMPORTTIME.match(line)
+        if current is not None and m:
+            lines[current].append((int(m[1]), int(m[2]), (len(m[3]) - 1) // 2, m[4]))
+    for phase, entries in lines.items():
+        result = phases[phase] = {"total_ms": 0.0, "modules": [], "packages": {}}
+        # importtime は子が親より先に出力されるので、逆順にたどって親を特定する
+        stack: list[str] = []
+        for self_us, cumulative_us, level, name in reversed(entries):
+            del stack[level:]
+            parent = stack[-1] if stack else ""
+            stack.append(name)
+            result["modules"].append(name)
+            top = name.split(".")[0]
+            pkg = result["packages"].setdefault(top, {"self_ms": 0.0, "cumulative_ms": 0.0})
+            pkg["self_ms"] += self_us / 1000
+            if level == 0:
+                result["total_ms"] += cumulative_us / 1000
+            if parent.split(".")[0] != top:
+                # パッケージの外から import されたところで、依存も含めた時間を数える
+                pkg["cumulative_ms"] += cumulative_us / 1000
+    return phases
+
+
+def run_once() -> dict:
+    """子プロセスで1回計測する."""
+    env = dict(os.environ, PYTHONPATH=str(ROOT), PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", str(CHILD)],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-4000:])
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["imports"] = parse_importtime(proc.stderr)
+    return result
+
+
+def summarize(runs: list) -> dict:
+    """複数回の計測結果を中央値でまとめる."""
+    phases = [name for name in runs[0]["imports"] if name not in ("setup", "done")]
+    summary: dict = {"init": {}, "handler": {}}
+    for phase in phases:
+        imports = [run["imports"].get(phase, {"total_ms": 0.0, "packages": {}}) for run in runs]
+        packages = {}
+        for pkg in VENDORED:
+            packages[pkg] = {
+                key: round(statistics.median(i["packages"].get(pkg, {}).get(key, 0.0) for i in imports), 3)
+                for key in ("self_ms", "cumulative_ms")
+            }
+        entry = {
+            "import_ms": round(statistics.median(i["total_ms"] for i in imports), 3),
+            "vendored": packages,
+            "modules": len(runs[0]["imports"].get(phase, {}).get("modules", [])),
+        }
+        if phase == "init":
+            entry["wall_ms"] = round(statistics.median(run["init_ms"] for run in runs), 3)
+            entry["loaded"] = sorted({m.split(".")[0] for m in runs[0]["imports"]["init"]["modules"]})
+            summary["init"] = entry
+        else:
+            entry["wall_ms"] = round(statistics.median(run["handler_ms"][phase] for run in runs), 3)
+            summary["handler"][phase] = entry
+    return summary
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def check_budget(summary: dict, budget_ms: float | None) -> list:
+    """予算違反の一覧を返す."""
+    errors = []
+    loaded = set(summary["init"]["loaded"])
+    for name in FORBIDDEN_AT_INIT:
+        if name in loaded:
+            errors.append(f"{name} is imported at cold start")
+    if budget_ms is not None and summary["init"]["import_ms"] > budget_ms:
+        errors.append(f"cold-start imports took {summary['init']['import_ms']}ms (budget {budget_ms}ms)")
+    return errors
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=5, help="計測回数(中央値を採用)")
+    parser.add_argument("--output", help="結果の JSON の出力先(省略時は標準出力)")
+    parser.add_argument("--budget-ms", type=float, help="コールドスタートの import 時間の上限")
+    args = parser.parse_args(argv)
+
+    runs = [run_once() for _ in range(args.repeat)]
+    summary = summarize(runs)
+    errors = check_budget(summary, args.budget_ms)
+    result = {
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "repeat": args.repeat,
+        **summary,
+        "budget_errors": errors,
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    for error in errors:
+        print(f"[BUDGET] {error}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""定期実行(CronAction.execute)の負荷シミュレーター.
+
+メモリ上の DynamoDB(FakeDynamo)に N 人のユーザーをランダムな購読設定で登録し、
+LINE の multicast API をローカルの偽物に向けて CronAction.execute を実行する。
+偽の LINE API は呼び出しを記録し、遅延や 429 (Too Many Requests) を注入できる。
+各ソースは記録済みのレスポンス(benchmarks/fixtures)を返す。
+
+結果として合計時間、API の呼び出し回数、ピーク RSS、プッシュ1回あたりのレイテンシ(p50/p99)を出力する。
+
+使い方:
+    python -m benchmarks.cron_load --users 10000
+    python -m benchmarks.cron_load --users 100000 --latency-ms 30 --rate-limit 0.01 --output cron.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import time
+from pathlib import Path
+
+from benchmarks import fakes
+from benchmarks.coldstart import git_revision
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# users テーブルの購読設定の属性と、有効にしている割合
+SUBSCRIPTIONS = {
+    "ait_enabled": 0.4,
+    "ait_new_all_enabled": 0.3,
+    "itmedia_news_enabled": 0.5,
+    "smart_jp_enabled": 0.1,
+    "uxmilk": 0.1,
+    "zdjapan_enabled": 0.3,
+    "techTarget": 0.2,
+}
+
+
+def seed_users(dynamo, users: int, enabled_ratio: float, rng: random.Random) -> int:
+    """ユーザーを登録し、定期実行を有効にしている人数を返す."""
+    enabled = 0
+    for i in range(users):
+        item = {
+            "user_id": {"S": f"U{i:032x}"},
+            "enabled": {"BOOL": rng.random() < enabled_ratio},
+        }
+        for name, ratio in SUBSCRIPTIONS.items():
+            if rng.random() < 0.9:
+                # 一度も切り替えていないユーザーは属性を持たない
+                item[name] = {"BOOL": rng.random() < ratio}
+        enabled += item["enabled"]["BOOL"]
+        dynamo.put_item(TableName="users", Item=item)
+    return enabled
+
+
+def multicast(latency_ms: float, rate_limit: float, rng: random.Random):
+    """偽の multicast API."""
+
+    def handler(request):
+        if rng.random() < rate_limit:
+            body = b'{"message":"The API rate limit has been exceeded. Try again later."}'
+            return fakes.Response(429, body, {"Content-Type": "application/json"}, latency_ms / 1000)
+        return fakes.Response(200, b"{}", {"Content-Type": "application/json"}, latency_ms / 1000)
+
+    return handler
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * p))], 3)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--enabled", type=float, default=0.8, help="定期実行を有効にしている割合")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="LINE API の応答に加える遅延")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="429 を返す割合")
+    parser.add_argument("--dynamo-latency-ms", type=float, default=0.0, help="DynamoDB の呼び出しに加える遅延")
+    parser.add_argument("--seed", type=int, default=32)
+    parser.add_argument("--output", help="結果の JSON の出力先(省略時は標準出力)")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault("access_token", "bench-token")
+    fakes.discard_logs()
+
+    import CronAction
+    import metrics
+
+    metrics.set_sink(metrics.null_sink)
+
+    rng = random.Random(args.seed)
+    dynamo = fakes.FakeDynamo(latency=args.dynamo_latency_ms / 1000)
+    enabled = seed_users(dynamo, args.users, args.enabled, rng)
+    dynamo.calls.clear()
+
+    # プッシュ1回ごとのレイテンシを計測する
+    push_ms: list[float] = []
+    original_push = CronAction.push
+
+    def timed_push(user_list, message):
+        started = time.perf_counter()
+        original_push(user_list, message)
+        push_ms.append((time.perf_counter() - started) * 1000)
+
+    CronAction.push = timed_push
+
+    with fakes.LocalServer() as server:
+        fakes.serve_fixtures(server)
+        server.add("api.line.me", "/v2/bot/message/multicast", multicast(args.latency_ms, args.rate_limit, rng))
+        fakes.install_redirect(server)
+        started = time.perf_counter()
+        asyncio.run(CronAction.CronAction(dynamo).execute())
+        runtime = time.perf_counter() - started
+        calls = [c for c in server.calls if c.request.path == "/v2/bot/message/multicast"]
+    metrics.flush()
+
+    statuses: dict[str, int] = {}
+    for call in calls:
+        statuses[str(call.status)] = statuses.get(str(call.status), 0) + 1
+    result = {
+        "revision": git_revision(),
+        "users": args.users,
+        "enabled_users": enabled,
+        "latency_ms": args.latency_ms,
+        "rate_limit": args.rate_limit,
+        "runtime_s": round(runtime, 3),
+        "api_calls": len(calls),
+        "recipients": sum(len(json.loads(c.request.body)["to"]) for c in calls),
+        "statuses": statuses,
+        "dynamo_calls": dynamo.calls,
+        # Linux の ru_maxrss は KB
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "push_ms": {"p50": percentile(push_ms, 0.5), "p99": percentile(push_ms, 0.99), "count": len(push_ms)},
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,417 @@
+"""ベンチマーク用のローカルスタンドイン.
+
+- FakeDynamo: boto3 の DynamoDB クライアントの代わり(使っているAPIだけ)
+- LocalServer: 外部サイトとLINE APIの代わりをするローカルHTTPサーバー
+- install_redirect: fetch の共有セッションの通信をすべて LocalServer に向ける
+- FakeContext: Lambda の context の代わり
+- serve_fixtures: 各ソースの記録済みレスポンス(benchmarks/fixtures)を LocalServer から返す
+"""
+
+import datetime
+import json
+import logging
+import os
+import re
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+class FakeClientError(Exception):
+    """botocore.exceptions.ClientError と同じ形の例外."""
+
+    def __init__(self, code: str, message: str = ""):
+        super().__init__(f"{code}: {message}")
+        self.response = {"Error": {"Code": code, "Message": message}}
+
+
+class FakeDynamo:
+    """メモリ上で動く DynamoDB クライアント.
+
+    ConditionExpression は attribute_not_exists / attribute_exists と、数値の "<" の OR だけ対応。
+    scan は DynamoDB と同じく1MBごとに区切って返す(LastEvaluatedKey)。
+    """
+
+    KEYS = {
+        "users": "user_id",
+        "webhook_events": "event_id",
+        "source_breakers": "source",
+        "hotpepper_cache": "query_key",
+        "source_snapshots": "source",
+    }
+    # scan の1回で返す大きさの上限
+    SCAN_PAGE_BYTES = 1024 * 1024
+
+    def __init__(self, keys: dict | None = None, latency: float = 0.0):
+        self.keys = dict(self.KEYS, **(keys or {}))
+        self.latency = latency
+        self.tables: dict[str, dict] = {}
+        self.calls: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _table(self, name: str) -> dict:
+        return self.tables.setdefault(name, {})
+
+    def _key_name(self, table: str, key: dict | None = None) -> str:
+        if table in self.keys:
+            return self.keys[table]
+        if key:
+            return next(iter(key))
+        raise FakeClientError("ValidationException", f"unknown key for {table}")
+
+    def _count(self, op: str) -> None:
+        self.calls[op] = self.calls.get(op, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _holds(self, item: dict | None, clause: str, names: dict, values: dict) -> bool:
+        match = re.fullmatch(r"attribute_(not_)?exists\((.+)\)", clause)
+        if match:
+            exists = item is not None and names.get(match.group(2), match.group(2)) in item
+            return not exists if match.group(1) else exists
+        attr, op, value = clause.split()
+        if op != "<" or item is None:
+            return False
+        current = item.get(names.get(attr, attr), {}).get("N")
+        return current is not None and float(current) < float(values[value]["N"])
+
+    def _check(self, table: str, key, condition: str | None, names: dict | None = None, values: dict | None = None):
+        if not condition:
+            return
+        item = self._table(table).get(key)
+        if not any(self._holds(item, clause.strip(), names or {}, values or {}) for clause in condition.split(" OR ")):
+            raise FakeClientError("ConditionalCheckFailedException", "The conditional request failed")
+
+    def put_item(
+        self,
+        TableName: str,
+        Item: dict,
+        ConditionExpression: str | None = None,
+        ExpressionAttributeNames: dict | None = None,
+        ExpressionAttributeValues: dict | None = None,
+        **_,
+    ):
+        self._count("put_item")
+        name = self._key_name(TableName)
+        key = next(iter(Item[name].values()))
+        with self._lock:
+            self._check(TableName, key, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+            self._table(TableName)[key] = json.loads(json.dumps(Item))
+        return {}
+
+    def get_item(self, TableName: str, Key: dict, **_):
+        self._count("get_item")
+        name = self._key_name(TableName, Key)
+        item = self._table(TableName).get(next(iter(Key[name].values())))
+        return {"Item": json.loads(json.dumps(item))} if item else {}
+
+    def delete_item(self, TableName: str, Key: dict, **_):
+        self._count("delete_item")
+        name = self._key_name(TableName, Key)
+        with self._lock:
+            self._table(TableName).pop(next(iter(Key[name].values())), None)
+        return {}
+
+    def scan(self, TableName: str, ExclusiveStartKey: dict | None = None, Limit: int | None = None, **_):
+        """DynamoDB と同じく、1回で返すのは SCAN_PAGE_BYTES(1MB)か Limit 件まで.
+
+        続きがあれば LastEvaluatedKey を返す。項目の大きさは JSON にしたときのバイト数で近似する。
+        """
+        self._count("scan")
+        name = self._key_name(TableName)
+        table = self._table(TableName)
+        keys = list(table)
+        start = 0
+        if ExclusiveStartKey:
+            start = keys.index(next(iter(ExclusiveStartKey[name].values()))) + 1
+        items, size = [], 0
+        for key in keys[start:]:
+            if Limit is not None and len(items) >= Limit:
+                break
+            data = json.dumps(table[key])
+            size += len(data.encode("utf-8"))
+            if items and size > self.SCAN_PAGE_BYTES:
+                break
+            items.append(json.loads(data))
+        result: dict = {"Items": items, "Count": len(items)}
+        if items and start + len(items) < len(keys):
+            result["LastEvaluatedKey"] = {name: items[-1][name]}
+        return result
+
+
+@dataclass
+class Request:
+    method: str
+    scheme: str
+    host: str
+    path: str
+    query: str
+    headers: dict
+    body: bytes
+
+
+@dataclass
+class Response:
+    status: int = 200
+    body: bytes = b""
+    headers: dict = field(default_factory=dict)
+    delay: float = 0.0
+
+
+@dataclass
+class Call:
+    request: Request
+    status: int
+    started: float
+    elapsed: float
+
+
+class LocalServer:
+    """外部サイトの代わりをするHTTPサーバー.
+
+    install_redirect で向けられたリクエストは /<scheme>/<host><path> というパスで届く。
+    (host, path) もしくは (host, None) で登録したハンドラが Response を返す。
+    """
+
+    def __init__(self):
+        self.routes: dict = {}
+        self.calls: list[Call] = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *_):
+                pass
+
+            def _handle(self):
+                started = time.perf_counter()
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                parsed = urllib.parse.urlsplit(self.path)
+                _, scheme, host, *rest = parsed.path.split("/", 3) + [""]
+                request = Request(
+                    method=self.command,
+                    scheme=scheme,
+                    host=host,
+                    path="/" + (rest[0] if rest else ""),
+                    query=parsed.query,
+                    headers=dict(self.headers),
+                    body=body,
+                )
+                response = server.dispatch(request)
+                if response.delay:
+                    time.sleep(response.delay)
+                self.send_response(response.status)
+                headers = {"Content-Type": "application/octet-stream", **response.headers}
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(response.body)))
+                self.end_headers()
+                self.wfile.write(response.body)
+                with server._lock:
+                    server.calls.append(Call(request, response.status, started, time.perf_counter() - started))
+
+            do_GET = _handle
+            do_POST = _handle
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add(self, host: str, path: str | None, handler) -> None:
+        """ハンドラを登録する. handler は Response もしくは Request を受け取る関数."""
+        self.routes[(host, path)] = handler
+
+    def dispatch(self, request: Request) -> Response:
+        handler = self.routes.get((request.host, request.path)) or self.routes.get((request.host, None))
+        if handler is None:
+            return Response(404, b"not found")
+        if isinstance(handler, Response):
+            return handler
+        return handler(request)
+
+    def start(self) -> "LocalServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+
+def install_redirect(server: LocalServer) -> None:
+    """fetch の共有セッションを LocalServer に向ける.
+
+    requests の import は本番と同じく初めて通信するときに起きるよう、
+    セッションが作られたときにアダプタを差し込む。
+    """
+    import fetch
+
+    original = fetch.session
+
+    def session():
+        s = original()
+        if not getattr(s, "_redirected", False):
+            s.mount("http://", _redirect_adapter(server.url))
+            s.mount("https://", _redirect_adapter(server.url))
+            s._redirected = True
+        return s
+
+    fetch.session = session
+
+
+def _redirect_adapter(base: str):
+    import fetch
+
+    class RedirectAdapter(fetch.adapter_class()):
+        def send(self, request, **kwargs):
+            url = urllib.parse.urlsplit(request.url)
+            request.url = f"{base}/{url.scheme}/{url.netloc}{url.path}" + (f"?{url.query}" if url.query else "")
+            return super().send(request, **kwargs)
+
+    return RedirectAdapter()
+
+
+def discard_logs() -> None:
+    """Lambda のログを捨てる.
+
+    ログの整形コストは計測に含めたいので、INFO のまま /dev/null に出力する。
+    """
+    logger = logging.getLogger(name="Lambda")
+    logger.setLevel(logging.INFO)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(logging.StreamHandler(open(os.devnull, "w")))
+    logger.propagate = False
+
+
+class FakeContext:
+    """Lambda の context の代わり."""
+
+    function_name = "linebot2-benchmark"
+    aws_request_id = "00000000-0000-0000-0000-000000000000"
+
+    def __init__(self, timeout_ms: int = 60_000):
+        self._deadline = time.monotonic() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+def line_api(server: LocalServer) -> None:
+    """LINE Messaging API の reply / multicast を 200 で受ける."""
+    ok = Response(200, b"{}", {"Content-Type": "application/json"})
+    server.add("api.line.me", "/v2/bot/message/reply", ok)
+    server.add("api.line.me", "/v2/bot/message/multicast", ok)
+
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+JST = datetime.timezone(datetime.timedelta(hours=9))
+# (host, path, fixture, Content-Type)
+SOURCES = [
+    ("rss.itmedia.co.jp", "/rss/2.0/ait.xml", "itmedia_rss.xml", "application/xml; charset=utf-8"),
+    ("rss.itmedia.co.jp", "/rss/2.0/news_bursts.xml", "itmedia_rss.xml", "application/xml; charset=utf-8"),
+    # Content-Type に charset がなく、XML 宣言が Shift_JIS のフィード
+    ("rss.itmedia.co.jp", "/rss/2.0/smartjapan.xml", "itmedia_rss_sjis.xml", "application/xml"),
+    ("rss.itmedia.co.jp", "/rss/2.0/techtarget.xml", "itmedia_rss.xml", "application/xml; charset=utf-8"),
+    ("uxmilk.jp", "/feed", "itmedia_rss.xml", "application/rss+xml; charset=UTF-8"),
+    ("feeds.japan.zdnet.com", "/rss/zdnet/all.rdf", "zdnet.rdf", "application/rdf+xml"),
+    ("www.atmarkit.co.jp", "/json/ait/rss_rankindex_all_day.json", "ait_ranking.js", "application/javascript"),
+    ("www.jpcert.or.jp", "/", "jpcert.html", "text/html; charset=utf-8"),
+    ("webservice.recruit.co.jp", "/hotpepper/gourmet/v1/", "hotpepper.json", "application/json;charset=utf-8"),
+    ("qiita.com", "/api/v2/items", "qiita.json", "application/json; charset=utf-8"),
+]
+PLACEHOLDER = re.compile(rb"%%(RFC822|ISO|DATE|JPCERT):(-?\d+)%%")
+FORMATS = {
+    b"RFC822": "%a, %d %b %Y %H:%M:%S +0900",
+    b"ISO": "%Y-%m-%dT%H:%M:%S+09:00",
+    b"DATE": "%Y-%m-%d",
+    b"JPCERT": "%Y-%m-%d %H:%M",
+}
+
+
+def render_fixture(name: str, now: datetime.datetime | None = None) -> bytes:
+    """フィクスチャを読み込み、日時のプレースホルダーを現在時刻(日本時間)からの相対で埋める.
+
+    %%RFC822:-60%% は60分前を RSS の pubDate 形式にする。
+    """
+    now = now or datetime.datetime.now(JST)
+
+    def replace(m):
+        return (now + datetime.timedelta(minutes=int(m[2]))).strftime(FORMATS[m[1]]).encode("ascii")
+
+    return PLACEHOLDER.sub(replace, (FIXTURES / name).read_bytes())
+
+
+def serve_fixtures(server: LocalServer) -> dict:
+    """各ソースの記録済みレスポンスを返すよう LocalServer に登録する.
+
+    Returns:
+        dict: (host, path) をキーにした Response
+    """
+    rendered: dict[str, bytes] = {}
+    responses = {}
+    for host, path, name, content_type in SOURCES:
+        if name not in rendered:
+            rendered[name] = render_fixture(name)
+        responses[(host, path)] = Response(200, rendered[name], {"Content-Type": content_type})
+        server.add(host, path, responses[(host, path)])
+    return responses
+
+
+def webhook_event(event: dict) -> dict:
+    """LINE webhook のイベントを API Gateway 経由のイベントに包む."""
+    return {"body": json.dumps({"destination": "Ubench", "events": [event]}, ensure_ascii=False)}
+
+
+_EVENT_SEQ = iter(range(1, 1 << 62))
+
+
+def line_event(event_type: str, user_id: str = "Ubench0001", **fields) -> dict:
+    """LINE webhook の events 要素を作る."""
+    event = {
+        "type": event_type,
+        "mode": "active",
+        "timestamp": int(time.time() * 1000),
+        "source": {"type": "user", "userId": user_id},
+        "webhookEventId": f"01BENCH{next(_EVENT_SEQ):019d}",
+        "deliveryContext": {"isRedelivery": False},
+    }
+    if event_type != "unfollow":
+        event["replyToken"] = "bench-reply-token"
+    event.update(fields)
+    return event
+
+
+def text_event(text: str, user_id: str = "Ubench0001") -> dict:
+    return line_event("message", user_id, message={"type": "text", "id": "1", "text": text})
+
+
+def postback_event(data: str, user_id: str = "Ubench0001") -> dict:
+    return line_event("postback", user_id, postback={"data": data})
+
+
+CRON_EVENT = {
+    "version": "0",
+    "id": "bench-cron",
+    "detail-type": "Scheduled Event",
+    "source": "aws.events",
+    "detail": {},
+}
@@ -0,0 +1,144 @@
+rankingindex({
+'data':[
+{
+'rank':'1',
+'title':'AWS̎nߕ',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/10/news100.html',
+'forum':'Cloud',
+'date':'%%DATE:-0%%'
+},
+{
+'rank':'2',
+'title':'ZLeBiޗRƂ',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/11/news101.html',
+'forum':'AI+',
+'date':'%%DATE:-90%%'
+},
+{
+'rank':'3',
+'title':'SaaS̎nߕ',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/12/news102.html',
+'forum':'Coding',
+'date':'%%DATE:-180%%'
+},
+{
+'rank':'4',
+'title':'SaaS̎nߕ',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/13/news103.html',
+'forum':'Security',
+'date':'%%DATE:-270%%'
+},
+{
+'rank':'5',
+'title':'5GO',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/14/news104.html',
+'forum':'Cloud',
+'date':'%%DATE:-360%%'
+},
+{
+'rank':'6',
+'title':'ZLeB̎nߕ',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/15/news105.html',
+'forum':'Coding',
+'date':'%%DATE:-450%%'
+},
+{
+'rank':'7',
+'title':'NEhŋƖ',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/16/news106.html',
+'forum':'AI+',
+'date':'%%DATE:-540%%'
+},
+{
+'rank':'8',
+'title':'5GŋƖ',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/17/news107.html',
+'forum':'AI+',
+'date':'%%DATE:-630%%'
+},
+{
+'rank':'9',
+'title':'DXۑ',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/18/news108.html',
+'forum':'Cloud',
+'date':'%%DATE:-720%%'
+},
+{
+'rank':'10',
+'title':'NEh̎nߕ',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/10/news109.html',
+'forum':'Security',
+'date':'%%DATE:-810%%'
+},
+{
+'rank':'11',
+'title':'ʎqRs[^̎nߕ',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/11/news110.html',
+'forum':'AI+',
+'date':'%%DATE:-900%%'
+},
+{
+'rank':'12',
+'title':'PythonɐV@\',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/12/news111.html',
+'forum':'Coding',
+'date':'%%DATE:-990%%'
+},
+{
+'rank':'13',
+'title':'ʎqRs[^O',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/13/news112.html',
+'forum':'Coding',
+'date':'%%DATE:-1080%%'
+},
+{
+'rank':'14',
+'title':'ZLeB̎nߕ',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/14/news113.html',
+'forum':'Security',
+'date':'%%DATE:-1170%%'
+},
+{
+'rank':'15',
+'title':'PythonŋƖ',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/15/news114.html',
+'forum':'Coding',
+'date':'%%DATE:-1260%%'
+},
+{
+'rank':'16',
+'title':'DXŉς̂',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/16/news115.html',
+'forum':'AI+',
+'date':'%%DATE:-1350%%'
+},
+{
+'rank':'17',
+'title':'[R[hO',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/17/news116.html',
+'forum':'Coding',
+'date':'%%DATE:-1440%%'
+},
+{
+'rank':'18',
+'title':'5GA̖{',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/18/news117.html',
+'forum':'AI+',
+'date':'%%DATE:-1530%%'
+},
+{
+'rank':'19',
+'title':'5G̗Ƃ',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/10/news118.html',
+'forum':'AI+',
+'date':'%%DATE:-1620%%'
+},
+{
+'rank':'20',
+'title':'ʎqRs[^A̖{',
+'link':'https://atmarkit.itmedia.co.jp/ait/articles/2610/11/news119.html',
+'forum':'Security',
+'date':'%%DATE:-1710%%'
+},
+''
+]})
@@ -0,0 +1,191 @@
+"""Actions の各ソースのベンチマーク.
+
+記録済みのレスポンス(benchmarks/fixtures)をローカルのHTTPサーバーから返し、
+ソースごとに取得(fetch)・解析(parse)・メッセージ作成(render)の時間とメモリ確保量を計測する。
+インターネットには接続しないので、パーサーやキャッシュの変更をオフラインで評価できる。
+
+- fetch: 同じURLを fetch.get して本文を読むまでの時間
+- parse: Actions のメソッド全体の時間から fetch を引いたもの
+- render: 取得結果から応答メッセージを作成し、JSON にするまでの時間
+- alloc: Actions のメソッド1回分の tracemalloc のピークと確保したブロック数
+
+結果は --history のファイルに1行ずつ追記し、前回との差を表示する。
+
+使い方:
+    python -m benchmarks.sources --iterations 30
+    python -m benchmarks.sources --only jpcertAlert,aitRanking
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks import fakes
+from benchmarks.coldstart import git_revision
+
+ROOT = Path(__file__).resolve().parent.parent
+HISTORY = Path(__file__).resolve().parent / "history" / "sources.jsonl"
+
+# Actions のメソッド名: (URL, 引数)
+SOURCES = {
+    "aitNewAll": ("https://rss.itmedia.co.jp/rss/2.0/ait.xml", []),
+    "aitRanking": ("https://www.atmarkit.co.jp/json/ait/rss_rankindex_all_day.json", []),
+    "itmediaNews": ("https://rss.itmedia.co.jp/rss/2.0/news_bursts.xml", []),
+    "techTarget": ("https://rss.itmedia.co.jp/rss/2.0/techtarget.xml", []),
+    "smartJp": ("https://rss.itmedia.co.jp/rss/2.0/smartjapan.xml", []),
+    "uxmilk": ("https://uxmilk.jp/feed", []),
+    "zdjapan": ("http://feeds.japan.zdnet.com/rss/zdnet/all.rdf", []),
+    "jpcertAlert": ("https://www.jpcert.or.jp", []),
+    "jpcertNotice": ("https://www.jpcert.or.jp", []),
+    "weeklyReport": ("https://www.jpcert.or.jp", []),
+    "lunch": ("http://webservice.recruit.co.jp/hotpepper/gourmet/v1/", []),
+    "nomitai": ("http://webservice.recruit.co.jp/hotpepper/gourmet/v1/", []),
+    "qiita": ("https://qiita.com/api/v2/items?page=1&per_page=3", []),
+}
+
+
+def percentiles(values: list) -> dict:
+    values = sorted(values)
+    if not values:
+        return {"p50": 0.0, "p95": 0.0}
+    return {
+        "p50": round(statistics.median(values), 3),
+        "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+    }
+
+
+def measure(loop, name: str, iterations: int) -> dict:
+    """1つのソースを計測する."""
+    import fetch
+    import hotpepper
+    import metrics
+    import qiita
+    from Actions import HEADER, Actions
+    from ReplyAction import build_message
+
+    url, args = SOURCES[name]
+    method = getattr(Actions, name)
+
+    def run_fetch():
+        return fetch.get(url, headers=HEADER).content
+
+    def run_action():
+        # 検索結果のキャッシュに当たらないようにして、取得と解析を毎回計測する
+        hotpepper.RESULTS.clear()
+        qiita.LATEST.clear()
+        qiita.BUCKET = qiita.TokenBucket(qiita.BUCKET.limit)
+        return loop.run_until_complete(method(list(args)))
+
+    def run_render(data):
+        return json.dumps(build_message(name, data), ensure_ascii=False)
+
+    # 初回は import やコネクションの確立が入るので捨てる
+    body = run_fetch()
+    data = run_action()
+    run_render(data)
+
+    fetch_ms, total_ms, render_ms = [], [], []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        run_fetch()
+        fetch_ms.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        data = run_action()
+        total_ms.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        payload = run_render(data)
+        render_ms.append((time.perf_counter() - started) * 1000)
+    metrics.flush()
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    run_action()
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+
+    return {
+        "bytes": len(body),
+        "items": len(data or []),
+        "payload_bytes": len(payload.encode("utf-8")),
+        "fetch_ms": percentiles(fetch_ms),
+        "parse_ms": percentiles([max(0.0, t - f) for t, f in zip(total_ms, fetch_ms)]),
+        "render_ms": percentiles(render_ms),
+        "total_ms": percentiles(total_ms),
+        "alloc_peak_kb": round(peak / 1024, 1),
+        "alloc_blocks": blocks,
+    }
+
+
+def previous(history: Path) -> dict:
+    if not history.exists():
+        return {}
+    lines = history.read_text(encoding="utf-8").strip().splitlines()
+    return json.loads(lines[-1]) if lines else {}
+
+
+def report(results: dict, last: dict) -> str:
+    """前回との比較表を作る."""
+    rows = [f"{'source':<14}{'bytes':>8}{'items':>7}{'fetch':>9}{'parse':>9}{'render':>9}{'peakKB':>9}{'Δtotal':>9}"]
+    for name, r in results.items():
+        before = last.get("results", {}).get(name, {}).get("total_ms", {}).get("p50")
+        delta = f"{(r['total_ms']['p50'] - before) / before * 100:+.0f}%" if before else "-"
+        rows.append(
+            f"{name:<14}{r['bytes']:>8}{r['items']:>7}{r['fetch_ms']['p50']:>9.2f}{r['parse_ms']['p50']:>9.2f}"
+            f"{r['render_ms']['p50']:>9.2f}{r['alloc_peak_kb']:>9.1f}{delta:>9}"
+        )
+    return "\n".join(rows)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--only", help="計測するソース(カンマ区切り)")
+    parser.add_argument("--history", default=str(HISTORY), help="結果を追記するファイル")
+    parser.add_argument("--no-history", action="store_true", help="履歴に追記しない")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault("hotpepper", "bench-key")
+    os.environ.setdefault("default_lat", "35.6812")
+    os.environ.setdefault("default_lng", "139.7671")
+    import metrics
+
+    metrics.set_sink(metrics.null_sink)
+
+    names = args.only.split(",") if args.only else list(SOURCES)
+    results = {}
+    loop = asyncio.new_event_loop()
+    with fakes.LocalServer() as server:
+        fakes.serve_fixtures(server)
+        fakes.install_redirect(server)
+        for name in names:
+            results[name] = measure(loop, name, args.iterations)
+    loop.close()
+
+    history = Path(args.history)
+    print(report(results, previous(history)))
+    if not args.no_history:
+        history.parent.mkdir(parents=True, exist_ok=True)
+        entry = {
+            "revision": git_revision(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "iterations": args.iterations,
+            "results": results,
+        }
+        with history.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
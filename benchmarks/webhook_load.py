@@ -0,0 +1,148 @@
+"""Webhook(lambda_handler)の負荷テスト.
+
+LINE の webhook の本文(follow / unfollow / テキストのコマンド / postback)を組み立て、
+指定したレートで lambda_handler をプロセス内で呼び出す。
+DynamoDB は FakeDynamo、reply API と各ソースはローカルのHTTPサーバーに向ける。
+
+コマンドの種類ごとのスループットとレイテンシのパーセンタイルを出力するので、
+どのコマンド(teiki, _help, lunch など)がハンドラの時間を占めているかがわかる。
+
+使い方:
+    python -m benchmarks.webhook_load --requests 2000 --rate 50
+    python -m benchmarks.webhook_load --duration 30 --rate 0 --users 5000   # --rate 0 は待ち時間なし
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from benchmarks import fakes
+from benchmarks.coldstart import git_revision
+from benchmarks.cron_load import seed_users
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 種類: (重み, イベントを作る関数)
+SCENARIOS = {
+    "follow": (2, lambda user: fakes.line_event("follow", user)),
+    "unfollow": (1, lambda user: fakes.line_event("unfollow", user)),
+    "_help": (10, lambda user: fakes.text_event("コマンド", user)),
+    "teiki": (15, lambda user: fakes.postback_event("定期実行確認", user)),
+    "toggle": (15, lambda user: fakes.postback_event(random.choice(["定期有効", "1有効", "4無効", "5有効"]), user)),
+    "lunch": (10, lambda user: fakes.postback_event("ランチ検索", user)),
+    "nomitai": (5, lambda user: fakes.text_event("居酒屋検索 新橋 焼き鳥", user)),
+    "jpcertAlert": (8, lambda user: fakes.postback_event("脆弱性関連情報", user)),
+    "aitRanking": (8, lambda user: fakes.postback_event("アットマークITの本日の総合ランキング", user)),
+    "itmediaNews": (8, lambda user: fakes.postback_event("ITmedia NEWS 最新記事一覧", user)),
+    "qiita": (5, lambda user: fakes.postback_event("Qiitaの新着", user)),
+    "chat": (13, lambda user: fakes.text_event("こんにちは", user)),
+}
+
+
+def summarize(latencies: list, elapsed: float) -> dict:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(statistics.median(values), 3),
+        "p90_ms": round(values[min(len(values) - 1, int(len(values) * 0.9))], 3),
+        "p99_ms": round(values[min(len(values) - 1, int(len(values) * 0.99))], 3),
+        "max_ms": round(values[-1], 3),
+        "total_ms": round(sum(values), 1),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--requests", type=int, default=1000, help="送るイベントの数")
+    parser.add_argument("--duration", type=float, help="指定した秒数だけ送る(--requests より優先)")
+    parser.add_argument("--rate", type=float, default=50, help="1秒あたりのイベント数(0 は待ち時間なし)")
+    parser.add_argument("--users", type=int, default=1000, help="users テーブルに登録しておく人数")
+    parser.add_argument("--only", help="送る種類(カンマ区切り)")
+    parser.add_argument("--seed", type=int, default=33)
+    parser.add_argument("--output", help="結果の JSON の出力先(省略時は標準出力)")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault("access_token", "bench-token")
+    os.environ.setdefault("hotpepper", "bench-key")
+    os.environ.setdefault("default_lat", "35.6812")
+    os.environ.setdefault("default_lng", "139.7671")
+
+    import lambda_function
+    import metrics
+
+    metrics.set_sink(metrics.null_sink)
+    # lambda_function が付けたハンドラも外す
+    fakes.discard_logs()
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    dynamo = fakes.FakeDynamo()
+    seed_users(dynamo, args.users, 0.8, rng)
+    dynamo.calls.clear()
+    lambda_function._DYNAMO = dynamo
+    user_ids = list(dynamo.tables["users"])
+
+    names = args.only.split(",") if args.only else list(SCENARIOS)
+    weights = [SCENARIOS[name][0] for name in names]
+    latencies: dict[str, list] = {name: [] for name in names}
+    errors: dict[str, int] = {}
+    interval = 1 / args.rate if args.rate else 0.0
+
+    with fakes.LocalServer() as server:
+        fakes.serve_fixtures(server)
+        fakes.line_api(server)
+        fakes.install_redirect(server)
+        started = time.perf_counter()
+        next_at = started
+        sent = 0
+        while True:
+            now = time.perf_counter()
+            if args.duration is not None and now - started >= args.duration:
+                break
+            if args.duration is None and sent >= args.requests:
+                break
+            if interval and now < next_at:
+                time.sleep(next_at - now)
+            next_at += interval
+            name = rng.choices(names, weights)[0]
+            event = fakes.webhook_event(SCENARIOS[name][1](rng.choice(user_ids)))
+            t = time.perf_counter()
+            try:
+                lambda_function.lambda_handler(event, fakes.FakeContext())
+            except Exception:
+                errors[name] = errors.get(name, 0) + 1
+            latencies[name].append((time.perf_counter() - t) * 1000)
+            sent += 1
+        elapsed = time.perf_counter() - started
+
+    per_command = {name: summarize(values, elapsed) for name, values in latencies.items() if values}
+    busy = sum(v["total_ms"] for v in per_command.values())
+    for value in per_command.values():
+        value["share_of_handler_time"] = round(value["total_ms"] / busy, 3) if busy else 0.0
+    result = {
+        "revision": git_revision(),
+        "requests": sent,
+        "elapsed_s": round(elapsed, 3),
+        "target_rps": args.rate,
+        "throughput_rps": round(sent / elapsed, 2) if elapsed else 0.0,
+        "errors": errors,
+        "dynamo_calls": dynamo.calls,
+        "commands": dict(sorted(per_command.items(), key=lambda kv: -kv[1]["total_ms"])),
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""ソースごとのサーキットブレーカー.
+
+何日も落ちている・遅いソースに、定期実行や返信のたびにタイムアウトまで待たされないようにする。
+
+- closed: 通常どおり取得する。連続で FAILURE_THRESHOLD 回失敗したら open にする
+- open: 取得せずに、直近の成功した結果(STALE_SECONDS 以内のもの)か空の結果を返す
+- half_open: open から COOLDOWN_SECONDS 経ったら、1回だけ取得を試す(プローブ)。
+  成功すれば closed に戻し、失敗すれば再び open にする
+
+状態はプロセス内に持つ。環境変数 breaker_table を指定すると DynamoDB にも保存し、
+コンテナをまたいで共有する(コンテナで初めて使うときに読み込み、失敗と状態の変化のたびに書き込む)。
+
+テーブル:
+{
+    "TableName": "source_breakers",
+    "Item": {
+        "source": {"S": "uxmilk"},
+        "state": {"S": "open"},
+        "failures": {"N": "3"},
+        "opened_at": {"N": "1700000000"},
+        "expires_at": {"N": "1700604800"}  # DynamoDBのTTL属性
+    }
+}
+"""
+
+import logging
+import os
+import time
+import traceback
+
+import metrics
+
+LOGGER = logging.getLogger(name="Lambda")
+
+TABLE_NAME = os.environ.get("breaker_table", "")
+# 連続で何回失敗したら open にするか
+FAILURE_THRESHOLD = int(os.environ.get("breaker_failures", "3"))
+# open にしてからプローブするまでの秒数
+COOLDOWN_SECONDS = float(os.environ.get("breaker_cooldown_seconds", "300"))
+# open の間に代わりに返してよい、成功した結果の古さ(秒)
+STALE_SECONDS = float(os.environ.get("breaker_stale_seconds", "600"))
+# DynamoDBに残しておく秒数
+TTL_SECONDS = 60 * 60 * 24 * 7
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# DynamoDBクライアントを返す関数(attach で設定する)
+_CLIENT = None
+
+
+class Breaker:
+    """ソース1つ分の状態."""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_good = None
+        self.last_good_at = 0.0
+        self.loaded = False
+
+    def allow(self) -> bool:
+        """取得してよければ True. cooldown が過ぎていればプローブとして half_open にする."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.time() - self.opened_at >= COOLDOWN_SECONDS:
+            self.state = HALF_OPEN
+            LOGGER.info(f"[BREAKER] {self.source} half_open (probe)")
+            return True
+        # open の間と、プローブ中のほかの呼び出しは取得しない
+        return False
+
+    def fallback(self):
+        """open の間に返す結果. 新しい成功結果があればそれを、なければ空を返す."""
+        if self.last_good is not None and time.time() - self.last_good_at <= STALE_SECONDS:
+            return list(self.last_good)
+        return []
+
+    def success(self, result) -> None:
+        self.last_good = list(result or [])
+        self.last_good_at = time.time()
+        if self.state == CLOSED and self.failures == 0:
+            return
+        if self.state != CLOSED:
+            LOGGER.info(f"[BREAKER] {self.source} closed")
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        save(self)
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= FAILURE_THRESHOLD:
+            if self.state != OPEN:
+                LOGGER.warning(f"[BREAKER] {self.source} open (failures: {self.failures})")
+            self.state = OPEN
+            self.opened_at = time.time()
+        save(self)
+
+
+BREAKERS: dict[str, Breaker] = {}
+
+
+def attach(client) -> None:
+    """状態の保存に使うDynamoDBクライアントを返す関数を設定する."""
+    global _CLIENT
+    _CLIENT = client
+
+
+def get(source: str) -> Breaker:
+    """ソースのブレーカーを返す. コンテナで初めて使うときは DynamoDB から読み込む."""
+    breaker = BREAKERS.get(source)
+    if breaker is None:
+        breaker = BREAKERS[source] = Breaker(source)
+    if not breaker.loaded:
+        breaker.loaded = True
+        load(breaker)
+    return breaker
+
+
+def load(breaker: Breaker) -> None:
+    if not TABLE_NAME or _CLIENT is None:
+        return
+    try:
+        item = _CLIENT().get_item(TableName=TABLE_NAME, Key={"source": {"S": breaker.source}}).get("Item")
+    except Exception:
+        # テーブルがない等の場合はプロセス内の状態だけで動かす
+        LOGGER.error(f"{traceback.format_exc()}")
+        return
+    if item:
+        breaker.state = item.get("state", {}).get("S", CLOSED)
+        breaker.failures = int(item.get("failures", {}).get("N", "0"))
+        breaker.opened_at = float(item.get("opened_at", {}).get("N", "0"))
+
+
+def save(breaker: Breaker) -> None:
+    if not TABLE_NAME or _CLIENT is None:
+        return
+    param = {
+        "TableName": TABLE_NAME,
+        "Item": {
+            "source": {"S": breaker.source},
+            # プローブ中に落ちても、次のコンテナが再びプローブできるように open として保存する
+            "state": {"S": CLOSED if breaker.state == CLOSED else OPEN},
+            "failures": {"N": str(breaker.failures)},
+            "opened_at": {"N": str(int(breaker.opened_at))},
+            "expires_at": {"N": str(int(time.time()) + TTL_SECONDS)},
+        },
+    }
+    try:
+        _CLIENT().put_item(**param)
+    except Exception:
+        LOGGER.error(f"{traceback.format_exc()}")
+
+
+def failed(call: metrics.SourceCall) -> bool:
+    """ソース1回分の計測値から、失敗したかどうかを判定する."""
+    return bool(call.error) or call.status >= 500
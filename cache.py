@@ -0,0 +1,58 @@
+"""プロセス内キャッシュ.
+
+Lambdaのコンテナが温まっている間だけ有効なキャッシュ。
+コンテナをまたいで共有したいものはDynamoDBなどに置くこと。
+"""
+
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """有効期限付きのLRUキャッシュ.
+
+    maxsize を超えたら最も古く参照されたものから捨てる。
+    ttl 秒を過ぎたものは参照時に捨てる。
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key, default=None):
+        """値を取得する. 期限切れもしくは存在しない場合は default を返す."""
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key, value, ttl: float | None = None) -> None:
+        """値を登録する."""
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """値を削除して返す."""
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_MISSING = object()
@@ -0,0 +1,175 @@
+"""レスポンスの文字コードの判定.
+
+requests の .text は charset_normalizer で本文全体を調べるので重い。ここでは安い順に調べる。
+
+1. BOM
+2. Content-Type の charset
+3. 先頭の XML 宣言の encoding もしくは <meta charset> (<meta http-equiv="Content-Type" content="...; charset=..."> も含む)
+4. 同じソースで前回判定した文字コード
+5. 先頭が UTF-8 として読めれば UTF-8、読めなければ呼び出し側のヒント(サイトがこれまで使っていた文字コード)
+6. どれでも決まらなければ、先頭の PREFIX_BYTES だけを charset_normalizer で調べる
+
+4〜6 で決めた結果はソースごとに CACHE に残す。
+"""
+
+import codecs
+import itertools
+import logging
+import re
+
+LOGGER = logging.getLogger(name="Lambda")
+
+# 調べる先頭のバイト数
+PREFIX_BYTES = 4096
+
+_BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+_CONTENT_TYPE = re.compile(r"""charset\s*=\s*["']?([\w.:-]+)""", re.IGNORECASE)
+_XML_DECLARATION = re.compile(rb"""^\s*<\?xml[^>]*?encoding\s*=\s*["']([\w.:-]+)""", re.IGNORECASE)
+_META = re.compile(rb"""<meta[^>]+?charset\s*=\s*["']?([\w.:-]+)""", re.IGNORECASE)
+# 日本語のサイトの Shift_JIS は、実際には Windows の拡張(cp932)を含むことが多い
+_ALIASES = {"shift_jis": "cp932"}
+
+# {ソース名: 文字コード}
+CACHE: dict[str, str] = {}
+
+
+def normalize(name: str | bytes | None) -> str | None:
+    """文字コード名を Python の codecs の名前にする. 知らない名前なら None."""
+    if not name:
+        return None
+    if isinstance(name, bytes):
+        name = name.decode("ascii", "ignore")
+    try:
+        codec = codecs.lookup(name).name
+    except LookupError:
+        return None
+    return _ALIASES.get(codec, codec)
+
+
+def sniff(prefix: bytes, content_type: str | None = None) -> str | None:
+    """BOM・Content-Type・XML 宣言・<meta> から文字コードを探す. なければ None."""
+    for bom, encoding in _BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    if content_type:
+        match = _CONTENT_TYPE.search(content_type)
+        if match and (encoding := normalize(match.group(1))):
+            return encoding
+    match = _XML_DECLARATION.match(prefix) or _META.search(prefix)
+    if match:
+        return normalize(match.group(1))
+    return None
+
+
+def _decodes(prefix: bytes, encoding: str) -> bool:
+    """prefix がその文字コードとして読めるか. 末尾で切れた文字は問わない."""
+    try:
+        codecs.getincrementaldecoder(encoding)().decode(prefix, final=False)
+    except (UnicodeDecodeError, LookupError):
+        return False
+    return True
+
+
+def detect(prefix: bytes) -> str:
+    """charset_normalizer で調べる. 最後の手段なので、ここで初めて import する."""
+    from charset_normalizer import from_bytes
+
+    best = from_bytes(prefix).best()
+    encoding = normalize(best.encoding) if best is not None else None
+    LOGGER.info(f"[CHARSET] detected {encoding}")
+    return encoding or "utf-8"
+
+
+def resolve(prefix: bytes, content_type: str | None = None, source: str | None = None, hint: str | None = None) -> str:
+    """文字コードを決める.
+
+    Args:
+        prefix (bytes): 本文の先頭
+        content_type (str): Content-Type ヘッダー
+        source (str): ソース名(判定結果のキャッシュのキー)
+        hint (str): 宣言がない場合に試す文字コード
+    """
+    prefix = prefix[:PREFIX_BYTES]
+    encoding = sniff(prefix, content_type)
+    if encoding:
+        return encoding
+    if source in CACHE:
+        return CACHE[source]
+    if prefix.isascii():
+        # ASCII だけでは判定できないので、キャッシュしない
+        return normalize(hint) or "utf-8"
+    if _decodes(prefix, "utf-8"):
+        encoding = "utf-8"
+    elif hint and _decodes(prefix, normalize(hint) or hint):
+        encoding = normalize(hint)
+    else:
+        encoding = detect(prefix)
+    if source:
+        CACHE[source] = encoding
+    return encoding
+
+
+def decode(body: bytes, content_type: str | None = None, source: str | None = None, hint: str | None = None) -> str:
+    """本文を文字列にする. 読めない文字は置き換える."""
+    return body.decode(resolve(body, content_type, source, hint), errors="replace")
+
+
+def iter_decode(chunks, content_type: str | None = None, source: str | None = None, hint: str | None = None):
+    """chunk ごとの本文を文字列にして返すジェネレーター. 文字コードは最初の chunk で決める."""
+    decoder = None
+    for chunk in chunks:
+        if decoder is None:
+            encoding = resolve(chunk, content_type, source, hint)
+            decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    if decoder is not None:
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+
+def iter_xml(chunks, content_type: str | None = None, source: str | None = None, hint: str | None = None):
+    """XML パーサーに渡す chunk (UTF-8 のバイト列)を返すジェネレーター.
+
+    UTF-8 と判定でき、XML 宣言とも食い違わなければ、変換せずにそのまま渡す。
+    それ以外は UTF-8 にし直し、最初の chunk の XML 宣言の encoding も utf-8 に書き換える
+    (expat は文字列を渡しても宣言の encoding を見るので、Shift_JIS などのままだと読めない)。
+    """
+    chunks = iter(chunks)
+    # 文字コードは先頭の PREFIX_BYTES で決めるので、それだけ溜めてから判定する
+    first = b""
+    for chunk in chunks:
+        first += chunk
+        if len(first) >= PREFIX_BYTES:
+            break
+    encoding = resolve(first, content_type, source, hint)
+    declared = _XML_DECLARATION.match(first[:PREFIX_BYTES])
+    if encoding == "utf-8" and (declared is None or normalize(declared.group(1)) == "utf-8"):
+        yield first
+        yield from chunks
+        return
+    head = b""
+    for text in iter_decode(itertools.chain([first], chunks), content_type, source, hint):
+        data = text.encode("utf-8")
+        if head is None:
+            yield data
+            continue
+        # XML 宣言が chunk の境目で切れていても書き換えられるよう、宣言の終わりまで溜める
+        head += data
+        if b"?>" not in head and len(head) < PREFIX_BYTES:
+            continue
+        declared = _XML_DECLARATION.match(head)
+        if declared:
+            head = head[: declared.start(1)] + b"utf-8" + head[declared.end(1) :]
+        yield head
+        head = None
+    if head:
+        yield head
@@ -0,0 +1,20 @@
+"""JPCERTのページの抽出に使う CSS セレクター.
+
+Tag.select("...") は呼ぶたびに soupsieve のキャッシュを引き、照合の準備をし直すので、
+soupsieve.compile したものを module の定数にして使い回す。
+soupsieve (bs4) は import が重いので、この module は使う関数の中で import する。
+"""
+
+import soupsieve
+
+# 見出しごとの枠
+CONTAINER = soupsieve.compile("div.container")
+HEADING = soupsieve.compile("h3")
+# 注意喚起・脆弱性関連情報の一覧
+LIST_ITEM = soupsieve.compile("ul.list>li")
+PUBLISHED = soupsieve.compile("span.left_area")
+TITLE = soupsieve.compile("span.right_area")
+# Weekly Report の号と目次
+WEEKLY_REPORT = soupsieve.compile("a.fl")
+WEEKLY_CONTENTS = soupsieve.compile("div.contents")
+ITEM = soupsieve.compile("li")
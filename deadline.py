@@ -0,0 +1,86 @@
+"""実行時間の予算(デッドライン).
+
+lambda_handler で context.get_remaining_time_in_millis() から予算を決め、
+各ソースの取得にはその一部だけを割り当てる。
+1つのソースが応答しなくても、残りのソースの取得と配信・返信の時間は残る。
+
+予算を使い切ったソースは DeadlineExceeded で取得をやめる(Actions ではエラーとして None になる)。
+"""
+
+import contextlib
+import contextvars
+import os
+import time
+
+# 配信や返信のために残しておく時間(ミリ秒)
+RESERVE_MS = int(os.environ.get("deadline_reserve_ms", "3000"))
+# 1回のリクエストの接続・読み込みのタイムアウトの上限(秒)
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10.0
+# これより残り時間が少なければリクエストを送らない(秒)
+MIN_REQUEST_SECONDS = 0.05
+
+
+class DeadlineExceeded(Exception):
+    """予算を使い切った."""
+
+
+_DEADLINE: contextvars.ContextVar[float | None] = contextvars.ContextVar("deadline", default=None)
+
+
+def remaining() -> float | None:
+    """残り時間(秒). 予算がなければ None."""
+    deadline = _DEADLINE.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+@contextlib.contextmanager
+def invocation(context):
+    """Lambda の1回の実行の予算を設定する. context がなければ予算なし."""
+    try:
+        remaining_ms = context.get_remaining_time_in_millis()
+    except AttributeError:
+        yield None
+        return
+    deadline = time.monotonic() + max(0, remaining_ms - RESERVE_MS) / 1000
+    token = _DEADLINE.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _DEADLINE.reset(token)
+
+
+@contextlib.contextmanager
+def share(parts: int):
+    """残り時間を parts 等分したうちの1つを予算にする.
+
+    残りのソースが parts 個ある場合に使う。使わなかった時間は次のソースに回る。
+    """
+    left = remaining()
+    if left is None:
+        yield None
+        return
+    deadline = time.monotonic() + max(0.0, left) / max(1, parts)
+    token = _DEADLINE.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _DEADLINE.reset(token)
+
+
+def check() -> None:
+    """予算を使い切っていたら DeadlineExceeded."""
+    left = remaining()
+    if left is not None and left < MIN_REQUEST_SECONDS:
+        raise DeadlineExceeded(f"deadline exceeded ({left * 1000:.0f}ms left)")
+
+
+def timeout() -> tuple[float, float]:
+    """requests に渡す (接続, 読み込み) のタイムアウト."""
+    check()
+    left = remaining()
+    if left is None:
+        return (CONNECT_TIMEOUT, READ_TIMEOUT)
+    return (min(CONNECT_TIMEOUT, left), min(READ_TIMEOUT, left))
@@ -1,16 +1,121 @@
 import functools
+import inspect
+import logging
+import os
+import random
+import time
+import traceback
 
+import breaker
+import metrics
+import tracing
+
+LOGGER = logging.getLogger(name="Lambda")
+
+# 戻り値をログに出す割合(0.0 〜 1.0)。デバッグ時だけ環境変数で指定する
+LOG_SAMPLE_RATE = float(os.environ.get("log_sample_rate", "0") or 0)
+
+
+def sampled() -> bool:
+    """LOG_SAMPLE_RATE の割合で True を返す(ペイロードをログに出すかどうか)."""
+    return bool(LOG_SAMPLE_RATE) and random.random() < LOG_SAMPLE_RATE
+
+
+def result_size(res) -> int:
+    """戻り値の大きさ(要素数)を返す.
+
+    flex メッセージの場合は body の要素数とする。
+    """
+    if isinstance(res, dict) and res.get("type") == "flex":
+        return len(res.get("contents", {}).get("body", {}).get("contents", []))
+    try:
+        return len(res)
+    except TypeError:
+        return 0 if res is None else 1
+
+
+def instrument(logger):
+    """実行時間と戻り値の大きさをメトリクスとして記録する.
+
+    トレースが有効な場合はスパンも記録する。
+    戻り値そのものは LOG_SAMPLE_RATE の割合でだけログに出す。
+    """
+
+    def instrument_wrapper(func):
+        name = func.__name__
+        label = func.__qualname__
+
+        def record(started: float, res) -> None:
+            dimensions = {"Function": name}
+            metrics.put("Duration", (time.perf_counter() - started) * 1000, "Milliseconds", dimensions)
+            metrics.put("ResultSize", result_size(res), "Count", dimensions)
+            if sampled():
+                logger.info(f"[SAMPLED] {name} res: {res}")
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracing.span(label):
+                    started = time.perf_counter()
+                    res = await func(*args, **kwargs)
+                    record(started, res)
+                    return res
+
+            return async_wrapper
 
-def log(logger):
-    def log_wrapper(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            logger.info(f"--START-- {func.__name__}")
-            res = func(*args, **kwargs)
-            logger.info(f"res: {res}")
-            logger.info(f"-- END -- {func.__name__}")
-            return res
+            with tracing.span(label):
+                started = time.perf_counter()
+                res = func(*args, **kwargs)
+                record(started, res)
+                return res
 
         return wrapper
 
-    return log_wrapper
+    return instrument_wrapper
+
+
+def takes_arguments(func) -> bool:
+    """cls 以外に名前のある引数を取るか(*_ だけなら取らない)."""
+    params = list(inspect.signature(func).parameters.values())[1:]
+    return any(p.kind not in (p.VAR_POSITIONAL, p.VAR_KEYWORD) for p in params)
+
+
+def source(func):
+    """Actions のソース1回分を metrics.source_call で計測する.
+
+    items_out は戻り値の件数とする。items_in はメソッドの中で metrics.received / metrics.counted で数える。
+    例外はここでログに出して計測値の error に残し、None を返す(エラー発生時の戻り値)。
+    ソースのブレーカーが open の場合は取得せず、breaker.Breaker.fallback の結果を返す。
+    引数で結果が変わるソース(検索など)は、別の引数の結果を返さないよう空を返す。
+    """
+    name = func.__name__
+    stale_ok = not takes_arguments(func)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with metrics.source_call(name) as call:
+            guard = breaker.get(name)
+            if not guard.allow():
+                res = guard.fallback() if stale_ok else []
+                call.cache = "stale" if res else None
+                call.items_out = len(res)
+                metrics.put("CircuitOpen", 1, "Count", {"Source": name})
+                return res
+            try:
+                res = await func(*args, **kwargs)
+            except Exception as e:
+                LOGGER.error(f"{traceback.format_exc()}")
+                call.error = call.error or type(e).__name__
+                guard.failure()
+                return None
+            if breaker.failed(call):
+                guard.failure()
+            else:
+                guard.success(res if stale_ok else None)
+            call.items_out = len(res) if res else 0
+            return res
+
+    return wrapper
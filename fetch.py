@@ -0,0 +1,209 @@
+"""外部へのHTTPアクセス.
+
+requests (urllib3, charset_normalizer, idna などを含む) の import はコールドスタートで重いので、
+実際に通信するときに初めて import する。
+セッションはコンテナが温まっている間使い回すので、コネクションも再利用される。
+
+GET のタイムアウトは deadline の予算から決める。予算を使い切っていれば送らずに DeadlineExceeded とする。
+接続のリセットや 5xx などの一時的な失敗は、ジッター付きのバックオフで RETRIES 回まで再試行する。
+再試行するのは GET などの冪等なメソッドだけで、予算が足りなければ再試行しない。
+
+stream / read は本文を chunk ごとに読み、max_bytes を超えた時点で ResponseTooLarge として打ち切る。
+上流がどれだけ大きなレスポンスを返しても、メモリに載るのは max_bytes までになる。
+
+環境変数 fetch_hedge を指定すると、ソースの GET のレスポンスヘッダーが直近の p95 を過ぎても届かない場合に
+別のコネクションでもう1つリクエストを送り、先に応答した方を使う(ヘッジ)。
+p95 は本文の読み込みや再試行を含まない、最初の1バイトまでの時間(first_byte_ms)から求める。
+
+metrics.source_call の中で呼ばれた場合は、DNS・接続・TLS・最初の1バイト・全体の時間と
+レスポンスのバイト数をその計測値に書き込む。
+"""
+
+import concurrent.futures
+import contextvars
+import os
+import time
+
+import deadline
+import metrics
+
+_SESSION = None
+
+# 一時的な失敗を再試行する回数
+RETRIES = int(os.environ.get("fetch_retries", "2"))
+# バックオフ(秒): BACKOFF_FACTOR * 2 ** (n - 1) + [0, BACKOFF_JITTER) の乱数、BACKOFF_MAX まで
+BACKOFF_FACTOR = 0.2
+BACKOFF_JITTER = 0.3
+BACKOFF_MAX = 2.0
+# 再試行するステータス
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# レスポンスの本文の上限(バイト). ソースごとの上限がなければこれを使う
+MAX_BYTES = int(os.environ.get("max_response_bytes", str(2 * 1024 * 1024)))
+# 本文を読むときの chunk の大きさ
+CHUNK_SIZE = 16 * 1024
+
+# ヘッジするかどうか
+HEDGE = os.environ.get("fetch_hedge", "") not in ("", "0")
+# p95 を信用するのに必要な直近の呼び出しの数
+HEDGE_MIN_SAMPLES = 20
+_EXECUTOR = None
+
+
+class ResponseTooLarge(Exception):
+    """レスポンスの本文が上限を超えた."""
+
+
+def adapter_class():
+    """計測用のコネクションを使う HTTPAdapter のクラスを返す(adapters.py)."""
+    from adapters import TimedAdapter
+
+    return TimedAdapter
+
+
+def session():
+    """共有の requests.Session を返す."""
+    global _SESSION
+    if _SESSION is None:
+        import requests
+
+        _SESSION = requests.Session()
+        _SESSION.mount("http://", adapter_class()())
+        _SESSION.mount("https://", adapter_class()())
+    return _SESSION
+
+
+def hedge_delay(call: metrics.SourceCall | None) -> float | None:
+    """ヘッジするまでの秒数. ヘッジしない場合は None."""
+    if not HEDGE or call is None:
+        return None
+    # ヘッジで競うのはレスポンスヘッダーが届くまでなので、本文の読み込みを含む fetch_ms ではなく first_byte_ms を使う
+    p95 = metrics.percentile(call.source, "first_byte_ms", 95, HEDGE_MIN_SAMPLES)
+    if p95 is None:
+        return None
+    left = deadline.remaining()
+    if left is not None and left < p95 / 1000 * 2:
+        # 2本目を待つだけの予算がなければヘッジしない
+        return None
+    return p95 / 1000
+
+
+def executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="hedge")
+    return _EXECUTOR
+
+
+def _discard(future: concurrent.futures.Future) -> None:
+    """使わなかった方のレスポンスを閉じる."""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def hedged_get(url: str, delay: float, call: metrics.SourceCall, **kwargs):
+    """delay 秒経っても応答がなければ2本目を送り、先に成功した方を返す."""
+    # 別スレッドでも計測値と予算が引き継がれるように context ごと渡す
+    first = executor().submit(contextvars.copy_context().run, session().get, url, **kwargs)
+    done, _ = concurrent.futures.wait([first], timeout=delay)
+    if done:
+        return first.result()
+    call.hedged = 1
+    second = executor().submit(contextvars.copy_context().run, session().get, url, **kwargs)
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                call.hedge_won = 1 if future is second else 0
+                for other in pending:
+                    other.add_done_callback(_discard)
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def get(url: str, **kwargs):
+    """GETリクエスト."""
+    call = metrics.current()
+    started = time.perf_counter()
+    try:
+        kwargs.setdefault("timeout", deadline.timeout())
+        delay = hedge_delay(call)
+        if delay is None:
+            res = session().get(url, **kwargs)
+        else:
+            res = hedged_get(url, delay, call, **kwargs)
+    except Exception as e:
+        if call is not None:
+            call.fetch_ms += (time.perf_counter() - started) * 1000
+            call.error = type(e).__name__
+        raise
+    if call is not None:
+        call.fetch_ms += (time.perf_counter() - started) * 1000
+        call.first_byte_ms += res.elapsed.total_seconds() * 1000
+        call.status = res.status_code
+        if not kwargs.get("stream"):
+            call.bytes += len(res.content)
+    return res
+
+
+def iter_body(res, max_bytes: int = MAX_BYTES):
+    """stream=True で取得したレスポンスの本文を chunk ごとに返すジェネレーター.
+
+    Content-Length もしくは読んだ量が max_bytes を超えたら ResponseTooLarge で打ち切り、コネクションを閉じる。
+    chunk を読む前に予算を確かめ、使い切っていれば DeadlineExceeded で打ち切る
+    (タイムアウトは chunk ごとにしか効かないので、少しずつ届く本文で予算を超えないように)。
+    本文を読む時間は計測値の fetch_ms に加える。
+    """
+    call = metrics.current()
+    with res:
+        length = res.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > max_bytes:
+            if call is not None:
+                call.error = "ResponseTooLarge"
+            raise ResponseTooLarge(f"{res.url}: Content-Length {length} > {max_bytes}")
+        received = 0
+        chunks = res.iter_content(CHUNK_SIZE)
+        while True:
+            deadline.check()
+            started = time.perf_counter()
+            chunk = next(chunks, None)
+            if call is not None:
+                call.fetch_ms += (time.perf_counter() - started) * 1000
+            if chunk is None:
+                return
+            received += len(chunk)
+            if call is not None:
+                call.bytes += len(chunk)
+            if received > max_bytes:
+                if call is not None:
+                    call.error = "ResponseTooLarge"
+                raise ResponseTooLarge(f"{res.url}: more than {max_bytes} bytes")
+            yield chunk
+
+
+def stream(url: str, max_bytes: int = MAX_BYTES, **kwargs):
+    """GETした本文を chunk ごとに返す(iter_body)."""
+    return iter_body(get(url, stream=True, **kwargs), max_bytes)
+
+
+def read(url: str, max_bytes: int = MAX_BYTES, **kwargs) -> bytes:
+    """GETした本文を max_bytes まで読んで返す. 超えたら ResponseTooLarge."""
+    return b"".join(stream(url, max_bytes, **kwargs))
+
+
+def read_response(url: str, max_bytes: int = MAX_BYTES, **kwargs) -> tuple:
+    """GETした (レスポンス, 本文) を返す. ヘッダーも使いたい場合に使う."""
+    res = get(url, stream=True, **kwargs)
+    return res, b"".join(iter_body(res, max_bytes))
+
+
+def post(url: str, **kwargs):
+    """POSTリクエスト.
+
+    LINE への返信・配信に使うので、予算ではなく固定のタイムアウトにする。
+    """
+    kwargs.setdefault("timeout", (deadline.CONNECT_TIMEOUT, deadline.READ_TIMEOUT))
+    return session().post(url, **kwargs)
@@ -0,0 +1,293 @@
+"""ホットペッパー グルメサーチAPI.
+
+検索結果(最大100件)は検索条件のハッシュをキーにしてプロセス内に RESULTS_TTL 秒だけ残し、
+PAGE_SIZE 件ずつ返す。続きがある場合は最後に「次へ」のポストバックを付ける。
+
+ポストバックのデータは「<コマンド> 次へ <ページ> <キーワード...>」とする。
+同じ検索条件を組み立て直せるので、キャッシュがない(別のコンテナなど)場合はもう一度検索する。
+
+座標での検索は、座標を geohash のセル(GEOHASH_PRECISION 桁)の中心に寄せてから検索する。
+同じ付近・同じ条件の検索は同じキーになり、昼休みに集中するデフォルト座標付近の検索もキャッシュから返せる。
+座標で API から取得した店舗は、絞り込み条件(ジャンル・キーワードなど)ごとの空間インデックス(spatial.GridIndex)に
+登録し、取得済みの範囲も覚えておく。位置情報での検索(nearby)は、取得済みの範囲に収まればインデックスだけで答える。
+
+環境変数 hotpepper_cache_table を指定すると、検索結果を DynamoDB にも保存してコンテナをまたいで共有する。
+
+テーブル:
+{
+    "TableName": "hotpepper_cache",
+    "Item": {
+        "query_key": {"S": "0123456789abcdef"},
+        "shops": {"S": "[{\"title\": \"...\", \"link\": \"...\"}, ...]"},
+        "expires_at": {"N": "1700000000"}  # DynamoDBのTTL属性
+    }
+}
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+import traceback
+
+import fetch
+import metrics
+import spatial
+from cache import TTLCache
+
+LOGGER = logging.getLogger(name="Lambda")
+
+URL = "http://webservice.recruit.co.jp/hotpepper/gourmet/v1/"
+TABLE_NAME = os.environ.get("hotpepper_cache_table", "")
+# 1ページに表示する件数
+PAGE_SIZE = 10
+# 検索結果を残しておく秒数
+RESULTS_TTL = 60 * 10
+# 座標を寄せる geohash の桁数(7桁で約150m四方)
+GEOHASH_PRECISION = int(os.environ.get("geohash_precision", "7"))
+# 「次へ」のポストバックで使う目印
+NEXT = "次へ"
+# 位置情報の引数の目印(@<緯度>,<経度>)
+LOCATION = "@"
+# 検索範囲(range)ごとの半径(メートル)
+RANGE_METERS = {"1": 300, "2": 500, "3": 1000, "4": 2000, "5": 3000}
+# 空間インデックスを残しておく秒数
+AREA_TTL = 60 * 60
+
+RESULTS = TTLCache(maxsize=128, ttl=RESULTS_TTL)
+# 絞り込み条件ごとの Area
+AREAS = TTLCache(maxsize=32, ttl=AREA_TTL)
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+# DynamoDBクライアントを返す関数(attach で設定する)
+_CLIENT = None
+
+
+def attach(client) -> None:
+    """検索結果の保存に使うDynamoDBクライアントを返す関数を設定する."""
+    global _CLIENT
+    _CLIENT = client
+
+
+def geohash(lat: float, lng: float, precision: int = GEOHASH_PRECISION) -> tuple[str, float, float]:
+    """座標の geohash と、そのセルの中心の (緯度, 経度) を返す."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bit, value, even = 0, 0, True
+    while len(chars) < precision:
+        target, coordinate = (lng_range, lng) if even else (lat_range, lat)
+        middle = (target[0] + target[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            target[0] = middle
+        else:
+            target[1] = middle
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(_BASE32[value])
+            bit, value = 0, 0
+    return "".join(chars), (lat_range[0] + lat_range[1]) / 2, (lng_range[0] + lng_range[1]) / 2
+
+
+def normalize(params: dict) -> dict:
+    """キャッシュのキーにできるよう検索条件を揃える.
+
+    キーワードの空白をまとめ、座標は geohash のセルの中心に寄せる。
+    """
+    params = {k: str(v) for k, v in params.items()}
+    if params.get("keyword"):
+        params["keyword"] = " ".join(params["keyword"].split())
+    if params.get("lat") and params.get("lng"):
+        _, lat, lng = geohash(float(params["lat"]), float(params["lng"]))
+        params["lat"] = f"{lat:.6f}"
+        params["lng"] = f"{lng:.6f}"
+    return params
+
+
+def query_key(params: dict) -> str:
+    """APIキーを除いた検索条件のハッシュ."""
+    query = {k: str(v) for k, v in params.items() if k != "key"}
+    return hashlib.sha1(json.dumps(query, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def load(key: str) -> list | None:
+    """DynamoDBから検索結果を読む. なければ None."""
+    if not TABLE_NAME or _CLIENT is None:
+        return None
+    try:
+        item = _CLIENT().get_item(TableName=TABLE_NAME, Key={"query_key": {"S": key}}).get("Item")
+    except Exception:
+        LOGGER.error(f"{traceback.format_exc()}")
+        return None
+    # TTL による削除は遅れることがあるので、期限はここでも見る
+    if not item or int(item.get("expires_at", {}).get("N", "0")) < time.time():
+        return None
+    return json.loads(item["shops"]["S"])
+
+
+def save(key: str, shops: list) -> None:
+    """検索結果をDynamoDBに書く."""
+    if not TABLE_NAME or _CLIENT is None:
+        return
+    param = {
+        "TableName": TABLE_NAME,
+        "Item": {
+            "query_key": {"S": key},
+            "shops": {"S": json.dumps(shops, ensure_ascii=False)},
+            "expires_at": {"N": str(int(time.time() + RESULTS_TTL))},
+        },
+    }
+    try:
+        _CLIENT().put_item(**param)
+    except Exception:
+        LOGGER.error(f"{traceback.format_exc()}")
+
+
+class Area:
+    """同じ絞り込み条件で取得した店舗の空間インデックスと、取得済みの範囲."""
+
+    def __init__(self):
+        self.index = spatial.GridIndex()
+        # (緯度, 経度, 半径) の配列. この範囲の店舗はすべてインデックスにある
+        self.coverage: list[tuple[float, float, float]] = []
+
+    def covers(self, lat: float, lng: float, radius: float) -> bool:
+        """円が取得済みの範囲に収まるか."""
+        return any(
+            spatial.distance(lat, lng, c_lat, c_lng) + radius <= c_radius for c_lat, c_lng, c_radius in self.coverage
+        )
+
+
+def area_key(params: dict) -> str:
+    """座標・範囲・並び順・件数を除いた絞り込み条件のハッシュ."""
+    return query_key({k: v for k, v in params.items() if k not in ("lat", "lng", "range", "order", "count")})
+
+
+def index(params: dict, shops: list, available: int) -> None:
+    """座標で取得した店舗を空間インデックスに登録する.
+
+    すべて取得できた場合は検索範囲を、距離順で途中までの場合は最も遠い店舗までを取得済みの範囲とする。
+    """
+    if not params.get("lat") or not params.get("lng"):
+        return
+    key = area_key(params)
+    area = AREAS.get(key)
+    if area is None:
+        area = Area()
+    AREAS.put(key, area)
+    lat, lng = float(params["lat"]), float(params["lng"])
+    located = [shop for shop in shops if shop.get("lat") is not None and shop.get("lng") is not None]
+    for shop in located:
+        area.index.add(shop["link"], shop["lat"], shop["lng"], shop)
+    radius = RANGE_METERS.get(str(params.get("range")), 1000)
+    if len(shops) < available:
+        if "order" in params or not located:
+            # 距離順でなければどこまで取得できたかわからない
+            return
+        radius = max(spatial.distance(lat, lng, shop["lat"], shop["lng"]) for shop in located)
+    area.coverage.append((lat, lng, radius))
+
+
+def location(args: list) -> tuple[list, tuple[float, float] | None]:
+    """引数から位置情報(@<緯度>,<経度>)を取り出し、(残りの引数, (緯度, 経度)) を返す."""
+    rest, found = [], None
+    for arg in args:
+        if arg.startswith(LOCATION) and found is None:
+            try:
+                lat, lng = (float(v) for v in arg[len(LOCATION) :].split(","))
+                found = (lat, lng)
+                continue
+            except ValueError:
+                pass
+        rest.append(arg)
+    return rest, found
+
+
+def location_arg(lat: float, lng: float) -> str:
+    """位置情報の引数."""
+    return f"{LOCATION}{lat:.6f},{lng:.6f}"
+
+
+def page_number(args: list) -> tuple[list, int]:
+    """引数の先頭が「次へ <ページ>」ならそれを取り除き、(残りの引数, ページ) を返す."""
+    args = list(args or [])
+    if len(args) >= 2 and args[0] == NEXT and args[1].isdigit():
+        return args[2:], max(1, int(args[1]))
+    return args, 1
+
+
+def search(params: dict, max_bytes: int = fetch.MAX_BYTES, headers: dict | None = None) -> list:
+    """店舗を検索する. 同じ検索条件の結果がキャッシュにあればそれを返す.
+
+    プロセス内、DynamoDB の順に探し、どちらにもなければ API を呼ぶ。
+
+    Returns:
+        list: {'title': '<店名>', 'link': '<URL>'} の配列
+    """
+    call = metrics.current()
+    params = normalize(params)
+    key = query_key(params)
+    shops = RESULTS.get(key)
+    if shops is None:
+        shops = load(key)
+        if shops is not None:
+            RESULTS.put(key, shops)
+    if shops is not None:
+        if call is not None:
+            call.cache = "hit"
+        return shops
+    if call is not None:
+        call.cache = "miss"
+    body = fetch.read(URL, max_bytes, params=params, headers=headers)
+    results = json.loads(body)["results"]
+    shops = [
+        {"title": shop["name"], "link": shop["urls"]["pc"], "lat": shop.get("lat"), "lng": shop.get("lng")}
+        for shop in results["shop"]
+    ]
+    RESULTS.put(key, shops)
+    save(key, shops)
+    index(params, shops, int(results.get("results_available", len(shops))))
+    return shops
+
+
+def nearby(params: dict, max_bytes: int = fetch.MAX_BYTES, headers: dict | None = None) -> list:
+    """params の座標の付近の店舗を近い順に返す.
+
+    取得済みの範囲に収まる場合は空間インデックスから返し、API は呼ばない。
+    """
+    call = metrics.current()
+    lat, lng = float(params["lat"]), float(params["lng"])
+    radius = RANGE_METERS.get(str(params.get("range")), 1000)
+    area = AREAS.get(area_key(normalize(params)))
+    if area is not None and area.covers(lat, lng, radius):
+        if call is not None:
+            call.cache = "hit"
+        return [shop for _, shop in area.index.near(lat, lng, radius)]
+    shops = search(params, max_bytes, headers)
+
+    def distance(shop: dict) -> float:
+        if shop.get("lat") is None or shop.get("lng") is None:
+            return float("inf")
+        return spatial.distance(lat, lng, shop["lat"], shop["lng"])
+
+    return sorted(shops, key=distance)
+
+
+def paginate(shops: list, number: int, command: str, args: list) -> list:
+    """number ページ目の店舗を返す. 続きがあれば「次へ」のポストバックを最後に付ける."""
+    start = (number - 1) * PAGE_SIZE
+    contents = list(shops[start : start + PAGE_SIZE])
+    if start + PAGE_SIZE < len(shops):
+        pages = -(-len(shops) // PAGE_SIZE)
+        contents.append(
+            {
+                "title": f"{NEXT} ({number + 1}/{pages})",
+                "link": None,
+                "postback": " ".join([command, NEXT, str(number + 1), *args]),
+            }
+        )
+    return contents
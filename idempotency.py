@@ -0,0 +1,134 @@
+"""Webhookイベントの重複排除.
+
+LINEは応答が遅い場合などに同じイベントを再送してくる(deliveryContext.isRedelivery)。
+webhookEventId をキーにして、すでに処理したイベントかどうかを判定する。
+
+まずプロセス内のLRUを見て、なければDynamoDBに条件付きで書き込む。
+書き込みに失敗した(既に存在した)場合は重複とみなす。
+DynamoDBは環境変数 idempotency_table にテーブル名を指定したときだけ使う(未指定ならコンテナ内のLRUだけで判定する)。
+
+処理中の登録は LEASE_SECONDS だけ有効にし、処理が終わったら complete で TTL_SECONDS に延ばす。
+処理が例外で終わった場合は release で登録を消し、LINE の再送で処理し直せるようにする。
+Lambda のタイムアウトなどで release できなかった場合も、LEASE_SECONDS 経てば再送を受け付ける。
+
+テーブル:
+{
+    "TableName": "webhook_events",
+    "Item": {
+        "event_id": {"S": "01FZ74A0TDDPYRVKNK77XKC3ZR"},
+        "expires_at": {"N": "1700000000"}  # DynamoDBのTTL属性
+    }
+}
+"""
+
+import logging
+import os
+import time
+import traceback
+
+from cache import TTLCache
+
+LOGGER = logging.getLogger(name="Lambda")
+
+TABLE_NAME = os.environ.get("idempotency_table", "")
+# DynamoDBに残しておく秒数(LINEの再送は最大でも数時間程度)
+TTL_SECONDS = 60 * 60 * 24
+# 処理中の登録を有効にしておく秒数(Lambda のタイムアウトより長くする)
+LEASE_SECONDS = int(os.environ.get("idempotency_lease_seconds", "900"))
+# 温まっているコンテナ内では、直近のイベントはDynamoDBを見ずに弾く
+SEEN = TTLCache(maxsize=1024, ttl=60 * 10)
+
+
+def error_code(e: Exception) -> str:
+    """botocoreのClientErrorからエラーコードを取り出す."""
+    return getattr(e, "response", {}).get("Error", {}).get("Code", "")
+
+
+def claim(dynamo, event: dict) -> bool:
+    """イベントを処理済みとして登録する.
+
+    Args:
+        dynamo: DynamoDBクライアント
+        event (dict): LINE webhook の events の要素
+
+    Returns:
+        bool: 初めて受け取ったイベントならTrue、重複ならFalse
+    """
+    event_id = event.get("webhookEventId")
+    if not event_id:
+        # 古い形式などでIDがない場合は判定できないので処理する
+        return True
+    if event_id in SEEN:
+        LOGGER.info(f"[IDEMPOTENCY] duplicate (memory) event_id: {event_id}")
+        return False
+    SEEN.put(event_id, True)
+    if not TABLE_NAME:
+        return True
+    now = int(time.time())
+    param = {
+        "TableName": TABLE_NAME,
+        "Item": {
+            "event_id": {"S": event_id},
+            "expires_at": {"N": str(now + LEASE_SECONDS)},
+        },
+        # 期限の切れた登録(処理中に落ちたもの)は TTL で消える前でも上書きしてよい
+        "ConditionExpression": "attribute_not_exists(event_id) OR expires_at < :now",
+        "ExpressionAttributeValues": {":now": {"N": str(now)}},
+    }
+    try:
+        dynamo.put_item(**param)
+    except Exception as e:
+        if error_code(e) == "ConditionalCheckFailedException":
+            LOGGER.info(f"[IDEMPOTENCY] duplicate (DynamoDB) event_id: {event_id}")
+            return False
+        # テーブルがない等で判定できない場合は処理を続ける
+        LOGGER.error(f"{traceback.format_exc()}")
+    return True
+
+
+def claim_all(dynamo, events: list) -> list:
+    """初めて受け取ったイベントだけを返す."""
+    return [event for event in events if claim(dynamo, event)]
+
+
+def complete(dynamo, event: dict) -> None:
+    """処理が終わったイベントの登録を TTL_SECONDS まで延ばす."""
+    event_id = event.get("webhookEventId")
+    if not event_id or not TABLE_NAME:
+        return
+    param = {
+        "TableName": TABLE_NAME,
+        "Item": {
+            "event_id": {"S": event_id},
+            "expires_at": {"N": str(int(time.time()) + TTL_SECONDS)},
+        },
+    }
+    try:
+        dynamo.put_item(**param)
+    except Exception:
+        LOGGER.error(f"{traceback.format_exc()}")
+
+
+def release(dynamo, event: dict) -> None:
+    """処理に失敗したイベントの登録を取り消す. LINE の再送で処理し直せるようにする."""
+    event_id = event.get("webhookEventId")
+    if not event_id:
+        return
+    SEEN.pop(event_id)
+    if not TABLE_NAME:
+        return
+    LOGGER.info(f"[IDEMPOTENCY] release event_id: {event_id}")
+    try:
+        dynamo.delete_item(TableName=TABLE_NAME, Key={"event_id": {"S": event_id}})
+    except Exception:
+        LOGGER.error(f"{traceback.format_exc()}")
+
+
+def complete_all(dynamo, events: list) -> None:
+    for event in events:
+        complete(dynamo, event)
+
+
+def release_all(dynamo, events: list) -> None:
+    for event in events:
+        release(dynamo, event)
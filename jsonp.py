@@ -0,0 +1,95 @@
+"""JSONP / JavaScript のリテラルの解析.
+
+アットマークITのランキングは rankingindex({...}) という JSONP で、文字列はシングルクォートで囲まれている。
+文字列を置き換えで直すとタイトル中の括弧やアポストロフィが壊れるので、次のように解析する。
+
+1. payload: 本文(バイト列)の最初の "(" と最後の ")" の間を取り出す(前後から1回ずつ探すだけ)
+2. loads: 文字列を1回の走査で JSON の形に直し、json.loads で読む
+   - シングルクォートの文字列はダブルクォートの文字列にする(\\' や中の " も正しく扱う)
+   - JavaScript にしかないエスケープ(\\x41, \\v, \\0, \\' など)は JSON のエスケープか文字そのものにする
+   - 末尾のカンマと、クォートのないキーも JSON の形にする
+   エスケープもダブルクォートもない場合は、シングルクォートを置き換えるだけにする。
+"""
+
+import json
+import re
+
+# 文字列(ダブル・シングル)、末尾のカンマ、クォートのないキーのいずれか
+_TOKEN = re.compile(
+    r"""
+    (?P<double>"(?:[^"\\]|\\.)*")
+    | '(?P<single>(?:[^'\\]|\\.)*)'
+    | ,(?P<trailing>\s*[\]}])
+    | (?P<key>(?<=[{,])\s*[A-Za-z_$][\w$]*)(?=\s*:)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+# 文字列の中のエスケープと "
+_ESCAPE = re.compile(r"""\\(x[0-9A-Fa-f]{2}|u[0-9A-Fa-f]{4}|.)|\"""", re.DOTALL)
+# JSON でもそのまま使えるエスケープ
+_JSON_ESCAPES = set('"\\/bfnrt')
+# JavaScript にしかないエスケープ(行末の \ は行の継続)
+_JS_ESCAPES = {"v": "\\u000b", "0": "\\u0000", "\n": "", "\r": "", "\u2028": "", "\u2029": ""}
+
+
+class JSONPError(ValueError):
+    """JSONP の形になっていない."""
+
+
+def payload(body: bytes) -> bytes:
+    """callback(...) の括弧の中を返す.
+
+    Shift_JIS などでも "(" と ")" は2バイト文字の一部にならないので、デコードする前のバイト列で探す。
+    """
+    start = body.find(b"(")
+    end = body.rfind(b")")
+    if start < 0 or end <= start:
+        raise JSONPError("callback parentheses not found")
+    return body[start + 1 : end]
+
+
+def _unescape(match: re.Match) -> str:
+    escaped = match.group(1)
+    if escaped is None:
+        # エスケープされていない "
+        return '\\"'
+    if len(escaped) == 3:
+        return f"\\u00{escaped[1:]}"
+    if len(escaped) == 5 or escaped in _JSON_ESCAPES:
+        return "\\" + escaped
+    if escaped in _JS_ESCAPES:
+        return _JS_ESCAPES[escaped]
+    # \' や桁の足りない \x など、それ以外は文字そのもの
+    return escaped
+
+
+def _replace(match: re.Match) -> str:
+    kind = match.lastgroup
+    if kind == "double":
+        return '"' + _ESCAPE.sub(_unescape, match.group("double")[1:-1]) + '"'
+    if kind == "trailing":
+        return match.group("trailing")
+    if kind == "key":
+        key = match.group("key")
+        return f'{key[: len(key) - len(key.lstrip())]}"{key.lstrip()}"'
+    return '"' + _ESCAPE.sub(_unescape, match.group("single")) + '"'
+
+
+def loads(text: str):
+    """JavaScript のリテラル(オブジェクト・配列など)を読む.
+
+    バックスラッシュもダブルクォートもなければ、シングルクォートはすべて文字列の区切りなので
+    そのまま置き換えて読む(ランキングはほとんどこの場合)。
+    """
+    if "\\" not in text and '"' not in text:
+        try:
+            return json.loads(text.replace("'", '"'), strict=False)
+        except ValueError:
+            # 末尾のカンマやクォートのないキーがある
+            pass
+    return json.loads(_TOKEN.sub(_replace, text), strict=False)
+
+
+def parse(body: bytes, encoding: str):
+    """JSONP の本文を読む."""
+    return loads(payload(body).decode(encoding))
@@ -31,10 +31,16 @@ import json
 import logging
 import os
 
-import boto3
-import requests
-from CronAction import CronAction
-from ReplyAction import ReplyAction
+import breaker
+import deadline
+import fetch
+import hotpepper
+import idempotency
+import metrics
+import settings
+import snapshot
+import tracing
+from message import create_header, create_message, create_postback_content
 
 LOGGER = logging.getLogger(name="Lambda")
 LOGGER.setLevel(logging.INFO)
@@ -44,10 +50,13 @@ formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s [%(filena
 stream_handler.setFormatter(formatter)
 LOGGER.addHandler(stream_handler)
 
-dynamo = boto3.client("dynamodb")
+# boto3 の import とクライアント生成は重いので、初めてDynamoDBを使うときに行う
+_DYNAMO = None
 
 TOKEN = ""
 USER_ID = ""
+# 位置情報を送ったときに選べる検索
+LOCATION_SEARCHES = ["ランチ検索", "居酒屋検索"]
 
 # def respond(err, res=None):
 #     return {
@@ -59,43 +68,40 @@ USER_ID = ""
 #     }
 
 
-def reply_message(message: str) -> None:
-    """返信.
+def get_dynamo():
+    """DynamoDBクライアントを返す."""
+    global _DYNAMO
+    if _DYNAMO is None:
+        import boto3
 
-    Args:
-        message (str): 送信するメッセージ
-    """
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {os.environ['access_token']}",
-    }
-    url = "https://api.line.me/v2/bot/message/reply"
-    payload = {
-        "replyToken": TOKEN,
-        "messages": [
-            {
-                "type": "text",
-                "text": message,
-            }
-        ],
-    }
-    res = requests.post(url, data=json.dumps(payload).encode("utf-8"), headers=headers)
-    LOGGER.info(f"[RESPONSE] [STATUS]{res.status_code} [HEADER]{res.headers} [CONTENT]{res.content}")
+        _DYNAMO = tracing.TracedClient(boto3.client("dynamodb"), "DynamoDB")
+    return _DYNAMO
+
+
+# ブレーカーの状態や検索結果、スナップショットを DynamoDB に保存する場合に使う
+breaker.attach(get_dynamo)
+hotpepper.attach(get_dynamo)
+snapshot.attach(get_dynamo)
 
 
-def reply(message: dict) -> None:
+@tracing.traced()
+def reply(message: dict | str | list) -> None:
     """返信.
 
     Args:
-        message (dict): 返信する辞書データ
+        message (dict | str | list): 返信する辞書データ、もしくはJSONにシリアライズ済みのもの。
+            複数送る場合はその配列(5件まで)
     """
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {os.environ['access_token']}",
     }
     url = "https://api.line.me/v2/bot/message/reply"
-    payload = {"replyToken": TOKEN, "messages": [message]}
-    res = requests.post(url, data=json.dumps(payload).encode("utf-8"), headers=headers)
+    messages = message if isinstance(message, list) else [message]
+    # シリアライズ済みのメッセージはそのまま埋め込む
+    messages = ", ".join(m if isinstance(m, str) else json.dumps(m) for m in messages)
+    data = f'{{"replyToken": {json.dumps(TOKEN)}, "messages": [{messages}]}}'
+    res = fetch.post(url, data=data.encode("utf-8"), headers=headers)
     LOGGER.info(f"[RESPONSE] [STATUS]{res.status_code} [HEADER]{res.headers} [CONTENT]{res.content}")
 
 
@@ -105,10 +111,10 @@ def add_user(user_id: str) -> None:
         "Item": {"user_id": {"S": user_id}, "enabled": {"BOOL": False}},
     }
     LOGGER.info(f"[DynamoDB insert] user_id: {user_id}")
-    dynamo.put_item(**param)
+    get_dynamo().put_item(**param)
 
 
-def update_user(user_id: str, params: dict) -> None:
+def update_user(user_id: str, params: dict) -> dict:
     """ユーザー情報更新.
 
     :param str user_id: 対象のユーザーID
@@ -118,72 +124,53 @@ def update_user(user_id: str, params: dict) -> None:
             "enabled": {"BOOL": True},
             ...
         }
+    :return: 更新後のユーザーの項目
     """
-    items = {}
-    for item in dynamo.scan(**{"TableName": "users"})["Items"]:
-        if user_id == item["user_id"]["S"]:
-            items.update(item)
-    param = {"TableName": "users", "Item": items}
+    items = get_dynamo().get_item(TableName="users", Key={"user_id": {"S": user_id}}).get("Item")
+    # follow していないユーザーは add_user と同じく定期実行を無効にした状態から作る
+    param = {"TableName": "users", "Item": items or {"user_id": {"S": user_id}, "enabled": {"BOOL": False}}}
     param["Item"].update(params)
     # dynamo.update_item(**param)
-    dynamo.put_item(**param)
+    get_dynamo().put_item(**param)
+    return param["Item"]
 
 
 def delete_user(user_id: str) -> None:
     """ユーザー削除."""
     param = {"TableName": "users", "Key": {"user_id": {"S": user_id}}}
-    dynamo.delete_item(**param)
-
-
-def toggle_teiki(enabled: bool) -> None:
-    """定期実行の有効化、もしくは無効化."""
-    params = {"enabled": {"BOOL": enabled}}
-    update_user(USER_ID, params)
-
-
-def toggle_ait(enabled: bool) -> None:
-    """アットマークITのランキングの定期実行有効化、もしくは無効化."""
-    params = {"ait_enabled": {"BOOL": enabled}}
-    update_user(USER_ID, params)
-
-
-def toggle_ait_new_all(enabled: bool) -> None:
-    """アットマークITの新着の定期実行有効化、もしくは無効化."""
-    params = {"ait_new_all_enabled": {"BOOL": enabled}}
-    update_user(USER_ID, params)
-
-
-def toggle_smart_jp(enabled: bool) -> None:
-    """スマートジャパンの新着の定期実行有効化、もしくは無効化."""
-    params = {"smart_jp_enabled": {"BOOL": enabled}}
-    update_user(USER_ID, params)
-
+    get_dynamo().delete_item(**param)
 
-def toggle_itmedia_news(enabled: bool) -> None:
-    """ITMedia NEWSの新着の定期実行有効化、もしくは無効化."""
-    params = {"itmedia_news_enabled": {"BOOL": enabled}}
-    update_user(USER_ID, params)
 
+def lambda_handler(event, context):
+    """Lambdaのエントリーポイント.
 
-def toggle_zdjapan(enabled: bool) -> None:
-    """ZDNet Japanの新着の定期実行有効化、もしくは無効化."""
-    params = {"zdjapan_enabled": {"BOOL": enabled}}
-    update_user(USER_ID, params)
-
+    実行中に溜めたメトリクスは最後にまとめて出力する。
+    トレースが有効な場合は、実行全体をルートスパンにする。
+    外部への取得は context の残り時間から決めた予算の中で行う。
+    """
+    try:
+        with tracing.invocation("lambda_handler"), deadline.invocation(context):
+            return handle(event, context)
+    finally:
+        metrics.flush()
 
-def toggle_uxmilk(enabled: bool) -> None:
-    """UX MILKの新着の定期実行有効化、もしくは無効化."""
-    params = {"uxmilk": {"BOOL": enabled}}
-    update_user(USER_ID, params)
 
+def refresh_handler(event, context):
+    """スナップショットの更新のエントリーポイント.
 
-def toggle_techTarget(enabled: bool) -> None:
-    """TechTargetの新着の定期実行有効化、もしくは無効化."""
-    params = {"techTarget": {"BOOL": enabled}}
-    update_user(USER_ID, params)
+    EventBridge のスケジュール(rate(10 minutes) など)でこの関数を呼ぶ別の Lambda を作る。
+    """
+    try:
+        with tracing.invocation("refresh_handler"), deadline.invocation(context):
+            LOGGER.info("--REFRESH START--")
+            saved = asyncio.run(snapshot.refresh())
+            LOGGER.info("--REFRESH END--")
+            return {"saved": saved}
+    finally:
+        metrics.flush()
 
 
-def lambda_handler(event, context):  # noqa: C901
+def handle(event, context):  # noqa: C901
     """Demonstrates a simple HTTP endpoint using API Gateway. You have full
     access to the request and response payload, including headers and
     status code.
@@ -193,7 +180,7 @@ def lambda_handler(event, context):  # noqa: C901
     PUT, or DELETE request respectively, passing in the payload to the
     DynamoDB API as a JSON body.
     """
-    global TOKEN, USER_ID
+    global USER_ID
     LOGGER.info("--LAMBDA START--")
     LOGGER.info(f"event: {json.dumps(event)}")
     LOGGER.info(f"context: {context}")
@@ -203,9 +190,36 @@ def lambda_handler(event, context):  # noqa: C901
     except Exception:
         body = {}
     LOGGER.info(f"body: {json.dumps(body)}")
+    events = []
+    if isinstance(body, dict) and body.get("events"):
+        # 再送されたイベントは重い処理の前に弾く
+        events = idempotency.claim_all(get_dynamo(), body["events"])
+        if not events:
+            LOGGER.info("--LAMBDA END-- (duplicate webhook)")
+            return respond_ok()
+        body["events"] = events
+    try:
+        ret = dispatch(event, body)
+    except Exception:
+        # 失敗したイベントは、LINE の再送で処理し直せるよう登録を取り消す
+        if events:
+            idempotency.release_all(get_dynamo(), events)
+        raise
+    if events:
+        idempotency.complete_all(get_dynamo(), events)
+    LOGGER.info(f"[RETURN] {ret}")
+    LOGGER.info("--LAMBDA END--")
+    return ret
+
+
+def dispatch(event, body):  # noqa: C901
+    """イベントの種類やコマンドに応じて処理する."""
+    global TOKEN
     if isinstance(event, dict) and event.get("source") == "aws.events":
         # CloudWatch Event のやつ
-        cronAction = CronAction(dynamo)
+        from CronAction import CronAction
+
+        cronAction = CronAction(get_dynamo())
         asyncio.run(cronAction.execute())
     # DynamoDBを使う時のデフォルトの使い方
     # operations = {
@@ -233,89 +247,67 @@ def lambda_handler(event, context):  # noqa: C901
             delete_user(user_id)
 
     text = ""
+    location = None
     # LINE webhook
     if isinstance(body, dict):
         for event in body.get("events", []):
             TOKEN = event.get("replyToken", "")
-            text = event.get("message", {}).get("text")
+            text = event.get("message", {}).get("text") or ""
+            location = event["message"] if event.get("message", {}).get("type") == "location" else None
             # postback の場合はメソッドのデフォルトで動作するように設定
             if event.get("postback", {}).get("data"):
                 text = event["postback"]["data"]
+    if location is not None:
+        reply(location_choice(location))
+        return respond_ok()
     text = text.replace("　", " ").replace("\n", " ")
     args = text.split(" ")
-    replyAction = ReplyAction(dynamo, USER_ID)
     if len(args) > 0 and args[0] == "コマンド":
-        reply(replyAction._help())
-    elif len(args) > 0 and args[0] == "定期無効":
-        toggle_teiki(False)
-        reply_message("定期実行を無効にしました")
-    elif len(args) > 0 and args[0] == "定期有効":
-        toggle_teiki(True)
-        reply_message("定期実行を有効にしました")
-    elif len(args) > 0 and args[0] == "1有効":
-        toggle_ait(True)
-        reply_message("アットマークITランキングを有効にしました")
-    elif len(args) > 0 and args[0] == "1無効":
-        toggle_ait(False)
-        reply_message("アットマークITランキングを無効にしました")
-    elif len(args) > 0 and args[0] == "2有効":
-        toggle_ait_new_all(True)
-        reply_message("アットマークITの全フォーラムの新着記事を有効にしました")
-    elif len(args) > 0 and args[0] == "2無効":
-        toggle_ait_new_all(False)
-        reply_message("アットマークITの全フォーラムの新着記事を無効にしました")
-    elif len(args) > 0 and args[0] == "3有効":
-        toggle_smart_jp(True)
-        reply_message("スマートジャパンの新着記事を有効にしました")
-    elif len(args) > 0 and args[0] == "3無効":
-        toggle_smart_jp(False)
-        reply_message("スマートジャパンの新着記事を無効にしました")
-    elif len(args) > 0 and args[0] == "4有効":
-        toggle_itmedia_news(True)
-        reply_message("ITmedia NEWS 最新記事一覧を有効にしました")
-    elif len(args) > 0 and args[0] == "4無効":
-        toggle_itmedia_news(False)
-        reply_message("ITmedia NEWS 最新記事一覧を無効にしました")
-    elif len(args) > 0 and args[0] == "5有効":
-        toggle_zdjapan(True)
-        reply_message("ZDNet Japan 最新情報 総合を有効にしました")
-    elif len(args) > 0 and args[0] == "5無効":
-        toggle_zdjapan(False)
-        reply_message("ZDNet Japan 最新情報 総合を無効にしました")
-    elif len(args) > 0 and args[0] == "6有効":
-        toggle_uxmilk(True)
-        reply_message("UX MILK の最新ニュースを有効にしました")
-    elif len(args) > 0 and args[0] == "6無効":
-        toggle_uxmilk(False)
-        reply_message("UX MILK の最新ニュースを無効にしました")
-    elif len(args) > 0 and args[0] == "7有効":
-        toggle_techTarget(True)
-        reply_message("TechTarget Japanの最新記事一覧を有効にしました")
-    elif len(args) > 0 and args[0] == "7無効":
-        toggle_techTarget(False)
-        reply_message("TechTarget Japanの最新記事一覧を無効にしました")
+        from ReplyAction import ReplyAction
+
+        reply(ReplyAction._help())
+    elif len(args) > 0 and (toggle := settings.parse(args[0])):
+        attribute, name, enabled = toggle
+        item = update_user(USER_ID, {attribute: {"BOOL": enabled}})
+        # 確認の文言と更新後の設定画面を返す
+        reply([settings.toggled(name, enabled), settings.payload(settings.states(item))])
     else:
+        from ReplyAction import ReplyAction
+
+        replyAction = ReplyAction(get_dynamo(), USER_ID)
         func = replyAction._method_search("".join(args))
         if func:
             LOGGER.info(f"method: {func}, param: {args[1:]}")
             asyncio.run(reply_action(replyAction, func, args[1:]))
 
+    return respond_ok()
+
+
+def location_choice(location: dict) -> dict:
+    """位置情報のメッセージに、その付近をランチと居酒屋のどちらで検索するか選ぶメッセージを返す.
+
+    選ぶとそれぞれの検索コマンド(「ランチ検索 @<緯度>,<経度>」など)がポストバックで届く。
+    """
+    arg = hotpepper.location_arg(location["latitude"], location["longitude"])
+    contents = [create_postback_content(command, f"{command} {arg}") for command in LOCATION_SEARCHES]
+    header = create_header(location.get("address") or "この付近を検索", None)
+    return create_message(header, contents, None)
+
+
+def respond_ok() -> dict:
+    """LINEに返すレスポンス."""
     payload = {
         "messages": [
             {"type": "text", "text": "200 OK"},
         ],
     }
-
-    ret = {
+    return {
         "statusCode": "200",
         "body": json.dumps(payload, ensure_ascii=False),
         "headers": {
             "Content-Type": "application/json",
         },
     }
-    LOGGER.info(f"[RETURN] {ret}")
-    LOGGER.info("--LAMBDA END--")
-    return ret
 
 
 async def reply_action(replyAction, func, args):
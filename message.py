@@ -1,3 +1,6 @@
+from tracing import traced
+
+
 def create_header(title: str, uri: str) -> dict:
     """メッセージヘッダーを作成する."""
     header = {
@@ -76,6 +79,57 @@ def create_content2(description: str, is_enable: bool, postback: str) -> dict:
     return content
 
 
+def create_postback_content(description: str, postback: str) -> dict:
+    """メッセージのcontentを作成する.
+
+    検索結果の「次へ」用
+    """
+    content = create_content(description, None)
+    content["contents"][0]["color"] = "#1e90ff"
+    content["action"] = {
+        "type": "postback",
+        "label": description[:20],
+        "data": postback,
+        "displayText": description,
+    }
+    return content
+
+
+def create_help_content(title: str, description: str, postback: str) -> dict:
+    """メッセージのcontentを作成する.
+
+    メソッド一覧用
+    """
+    content = {
+        "type": "box",
+        "layout": "vertical",
+        "paddingAll": "4px",
+        "contents": [
+            {
+                "type": "text",
+                "text": title,
+                "color": "#35393c",
+                "wrap": True,
+            },
+            {
+                "type": "text",
+                "text": description,
+                "size": "xs",
+                "color": "#8C8C8C",
+                "wrap": True,
+            },
+        ],
+        "action": {
+            "type": "postback",
+            "label": postback,
+            "data": postback,
+            "displayText": postback,
+        },
+        "flex": 0,
+    }
+    return content
+
+
 def create_footer(text: str) -> dict:
     """メッセージのフッターを作成する."""
     footer = {
@@ -95,6 +149,7 @@ def create_footer(text: str) -> dict:
     return footer
 
 
+@traced()
 def create_message(header: dict, contents: list, footer: dict):
     """メッセージ全体を作成する."""
     message = {
@@ -0,0 +1,226 @@
+"""メトリクス.
+
+計測値はプロセス内に溜めておき、flush で CloudWatch Embedded Metric Format (EMF) の
+JSON として出力する。Lambda の標準出力に EMF を書くと CloudWatch Logs が自動でメトリクスにする。
+出力先は set_sink で差し替えられる(ベンチマークなどで使う)。
+
+EMF:
+{
+    "_aws": {
+        "Timestamp": 1700000000000,
+        "CloudWatchMetrics": [
+            {
+                "Namespace": "linebot2",
+                "Dimensions": [["Function"]],
+                "Metrics": [{"Name": "Duration", "Unit": "Milliseconds"}]
+            }
+        ]
+    },
+    "Function": "executeAction",
+    "Duration": [12.3, 4.5]
+}
+"""
+
+import collections
+import contextlib
+import contextvars
+import json
+import os
+import time
+
+NAMESPACE = os.environ.get("metrics_namespace", "linebot2")
+# EMF の1メトリクスに入れられる値の上限
+MAX_VALUES = 100
+# ソースごとに保持しておく直近の呼び出しの数
+HISTORY_SIZE = 200
+
+
+def stdout_sink(line: str) -> None:
+    """標準出力に書く(Lambda では CloudWatch Logs に送られる)."""
+    print(line, flush=True)
+
+
+def null_sink(line: str) -> None:
+    """何もしない."""
+
+
+class Registry:
+    """メトリクスを溜めておき、ディメンションごとにまとめて出力する."""
+
+    def __init__(self, namespace: str = NAMESPACE, sink=stdout_sink):
+        self.namespace = namespace
+        self.sink = sink
+        # {(("Function", "executeAction"),): {"Duration": ("Milliseconds", [12.3])}}
+        self._metrics: dict[tuple, dict[str, tuple[str, list]]] = {}
+
+    def put(self, name: str, value: float, unit: str = "None", dimensions: dict | None = None) -> None:
+        """値を追加する."""
+        key = tuple(sorted((dimensions or {}).items()))
+        metrics = self._metrics.setdefault(key, {})
+        metrics.setdefault(name, (unit, []))[1].append(value)
+
+    def documents(self) -> list:
+        """溜まっている値を EMF の辞書にして返す."""
+        timestamp = int(time.time() * 1000)
+        documents = []
+        for key, metrics in self._metrics.items():
+            names = list(metrics)
+            for start in range(0, max(len(v) for _, v in metrics.values()), MAX_VALUES):
+                document = {
+                    "_aws": {
+                        "Timestamp": timestamp,
+                        "CloudWatchMetrics": [
+                            {
+                                "Namespace": self.namespace,
+                                "Dimensions": [[k for k, _ in key]],
+                                "Metrics": [{"Name": name, "Unit": metrics[name][0]} for name in names],
+                            }
+                        ],
+                    },
+                    **dict(key),
+                }
+                for name in names:
+                    values = metrics[name][1][start : start + MAX_VALUES]
+                    if values:
+                        document[name] = values
+                documents.append(document)
+        return documents
+
+    def flush(self) -> None:
+        """溜まっている値を出力して空にする."""
+        documents = self.documents()
+        self._metrics.clear()
+        for document in documents:
+            self.sink(json.dumps(document, ensure_ascii=False, separators=(",", ":")))
+
+
+REGISTRY = Registry()
+
+
+def put(name: str, value: float, unit: str = "None", dimensions: dict | None = None) -> None:
+    """共有のレジストリに値を追加する."""
+    REGISTRY.put(name, value, unit, dimensions)
+
+
+def flush() -> None:
+    """共有のレジストリを出力する. Lambda の実行の最後に呼ぶ."""
+    REGISTRY.flush()
+
+
+def set_sink(sink) -> None:
+    """出力先を差し替える. sink は1行の文字列を受け取る関数."""
+    REGISTRY.sink = sink
+
+
+class SourceCall:
+    """ソース1回分の計測値.
+
+    HTTP の各段階の時間は fetch が、キャッシュの結果は Actions が、エラーと返した件数は decos.source が埋める。
+    受け取った件数(items_in)は Actions が received / counted で数える。
+    再利用したコネクションでは dns / connect / tls は 0 になる。
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.dns_ms = 0.0
+        self.connect_ms = 0.0
+        self.tls_ms = 0.0
+        # リクエストを送ってからレスポンスヘッダーを受け取るまで
+        self.first_byte_ms = 0.0
+        # 本文を読み終わるまで
+        self.fetch_ms = 0.0
+        self.bytes = 0
+        # 一時的な失敗で再試行した回数
+        self.retries = 0
+        # 2本目のリクエストを送ったか、2本目が先に応答したか
+        self.hedged = 0
+        self.hedge_won = 0
+        self.parse_ms = 0.0
+        self.items_in = 0
+        self.items_out = 0
+        # "hit" / "miss" / "stale"、キャッシュを使わない場合は None
+        self.cache: str | None = None
+        self.status = 0
+        self.error = ""
+        self.total_ms = 0.0
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+_CURRENT: contextvars.ContextVar[SourceCall | None] = contextvars.ContextVar("source_call", default=None)
+HISTORY: dict[str, collections.deque] = {}
+
+
+def current() -> SourceCall | None:
+    """実行中のソースの計測値を返す. ソースの外なら None."""
+    return _CURRENT.get()
+
+
+def received(count: int) -> None:
+    """上流から受け取った要素の数を、実行中のソースの items_in に足す."""
+    call = current()
+    if call is not None:
+        call.items_in += count
+
+
+def counted(items):
+    """上流から受け取った要素を、実行中のソースの items_in に数えながら順に返す."""
+    call = current()
+    for item in items:
+        if call is not None:
+            call.items_in += 1
+        yield item
+
+
+@contextlib.contextmanager
+def source_call(source: str):
+    """ソース1回分を計測する.
+
+    抜けるときにレジストリに書き込み、HISTORY にも残す。
+    parse_ms は全体の時間から HTTP の時間を引いたもの(解析と絞り込み)とする。
+    """
+    call = SourceCall(source)
+    token = _CURRENT.set(call)
+    started = time.perf_counter()
+    try:
+        yield call
+    finally:
+        _CURRENT.reset(token)
+        call.total_ms = (time.perf_counter() - started) * 1000
+        call.parse_ms = max(0.0, call.total_ms - call.fetch_ms)
+        record_source(call)
+
+
+def percentile(source: str, field: str, q: float, min_samples: int = 1) -> float | None:
+    """HISTORY にある成功した呼び出しの field の q パーセンタイル. 数が足りなければ None."""
+    values = sorted(getattr(c, field) for c in HISTORY.get(source, ()) if not c.error)
+    if not values or len(values) < min_samples:
+        return None
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+
+def record_source(call: SourceCall) -> None:
+    """ソースの計測値をレジストリに書き込む."""
+    dimensions = {"Source": call.source}
+    for name, value, unit in (
+        ("Dns", call.dns_ms, "Milliseconds"),
+        ("Connect", call.connect_ms, "Milliseconds"),
+        ("Tls", call.tls_ms, "Milliseconds"),
+        ("FirstByte", call.first_byte_ms, "Milliseconds"),
+        ("Fetch", call.fetch_ms, "Milliseconds"),
+        ("Parse", call.parse_ms, "Milliseconds"),
+        ("ResponseBytes", call.bytes, "Bytes"),
+        ("Retries", call.retries, "Count"),
+        ("ItemsIn", call.items_in, "Count"),
+        ("ItemsOut", call.items_out, "Count"),
+    ):
+        put(name, value, unit, dimensions)
+    if call.hedged:
+        put("Hedged", 1, "Count", dimensions)
+        put("HedgeWon", call.hedge_won, "Count", dimensions)
+    if call.cache:
+        put("CacheHit", 1 if call.cache == "hit" else 0, "Count", dimensions)
+    if call.error:
+        put("Errors", 1, "Count", dimensions)
+    HISTORY.setdefault(call.source, collections.deque(maxlen=HISTORY_SIZE)).append(call)
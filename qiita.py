@@ -0,0 +1,161 @@
+"""Qiita API v2 クライアント.
+
+認証なしでは1時間あたりの回数が少ない(IPアドレスごとに60回)ので、
+レスポンスの Rate-Limit / Rate-Remaining / Rate-Reset ヘッダーを見てトークンバケットで残りを管理する。
+
+- 直近 FRESH_SECONDS 秒以内に取得した新着記事は API を呼ばずに返す
+- 残りが少ない(LOW_WATER 以下)もしくは 429 が返った場合は、古い結果があればそれを返す
+
+環境変数 qiita_token にアクセストークンを指定すると認証付きで呼ぶ(1時間あたり1000回)。
+"""
+
+import json
+import logging
+import os
+import time
+import traceback
+
+import fetch
+import metrics
+
+LOGGER = logging.getLogger(name="Lambda")
+
+URL = "https://qiita.com/api/v2/items"
+TOKEN = os.environ.get("qiita_token", "")
+# 新着記事を API を呼ばずに使い回す秒数
+FRESH_SECONDS = 60
+# 残りがこの割合以下になったら、古い結果があればそれを返す
+LOW_WATER = 0.1
+
+
+class RateLimited(Exception):
+    """API の残りがなく、返せる結果もない."""
+
+
+class TokenBucket:
+    """API の残り回数.
+
+    ヘッダーを受け取るまでは limit / period の速さで補充する。
+    受け取った後は Rate-Remaining を残りとし、Rate-Reset の時刻に limit まで戻す。
+    """
+
+    def __init__(self, limit: int, period: float = 60 * 60):
+        self.limit = limit
+        self.period = period
+        self.tokens = float(limit)
+        self.reset_at = 0.0
+        self.updated = time.time()
+
+    def _refill(self) -> None:
+        now = time.time()
+        if self.reset_at:
+            if now >= self.reset_at:
+                self.tokens = float(self.limit)
+                self.reset_at = 0.0
+        else:
+            self.tokens = min(float(self.limit), self.tokens + (now - self.updated) * self.limit / self.period)
+        self.updated = now
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+    def low(self) -> bool:
+        """残りが少ないか."""
+        return self.available() <= self.limit * LOW_WATER
+
+    def take(self) -> bool:
+        """1回分使う. 残りがなければ False."""
+        self._refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def update(self, headers) -> None:
+        """レスポンスの Rate-* ヘッダーで残りを合わせる."""
+        try:
+            if headers.get("Rate-Limit"):
+                self.limit = int(headers["Rate-Limit"])
+            if headers.get("Rate-Remaining"):
+                self.tokens = float(headers["Rate-Remaining"])
+            if headers.get("Rate-Reset"):
+                self.reset_at = float(headers["Rate-Reset"])
+            self.updated = time.time()
+        except ValueError:
+            LOGGER.warning(f"[QIITA] invalid rate headers: {dict(headers)}")
+
+
+BUCKET = TokenBucket(1000 if TOKEN else 60)
+# {per_page: (取得した時刻, 記事の配列)}
+LATEST: dict[int, tuple[float, list]] = {}
+
+
+def _fallback(cached: tuple[float, list], call: metrics.SourceCall | None) -> list:
+    """取得せずに古い結果を返す."""
+    if call is not None:
+        call.cache = "stale"
+    return cached[1]
+
+
+def _reuse(cached: tuple[float, list] | None, call: metrics.SourceCall | None) -> list | None:
+    """API を呼ばずに返せる結果. 呼ぶ必要があれば None.
+
+    FRESH_SECONDS 以内の結果はそのまま、残りが少なければ古い結果を返す。
+    """
+    if not cached:
+        return None
+    if time.time() - cached[0] < FRESH_SECONDS:
+        if call is not None:
+            call.cache = "hit"
+        return cached[1]
+    if BUCKET.low():
+        LOGGER.info(f"[QIITA] rate remaining {BUCKET.available():.0f}, serving stale items")
+        return _fallback(cached, call)
+    return None
+
+
+def _fetch(per_page: int, max_bytes: int, headers: dict) -> list:
+    """API を呼んで記事の配列を返す."""
+    if TOKEN:
+        headers["Authorization"] = f"Bearer {TOKEN}"
+    res, body = fetch.read_response(URL, max_bytes, params={"page": 1, "per_page": per_page}, headers=headers)
+    BUCKET.update(res.headers)
+    metrics.put("RateRemaining", BUCKET.available(), "Count", {"Source": "qiita"})
+    if res.status_code == 429:
+        BUCKET.tokens = 0.0
+        raise RateLimited("Qiita returned 429")
+    if res.status_code != 200:
+        # エラーの本文({"message": ..., "type": ...})は記事として扱わない
+        raise RuntimeError(f"Qiita returned {res.status_code}: {body[:200]!r}")
+    data = json.loads(body)
+    if not isinstance(data, list):
+        raise ValueError(f"unexpected Qiita response: {type(data).__name__}")
+    return data
+
+
+def items(per_page: int = 3, max_bytes: int = fetch.MAX_BYTES, headers: dict | None = None) -> list:
+    """新着記事を返す.
+
+    Returns:
+        list: API の items のレスポンス(記事の辞書の配列)
+    """
+    call = metrics.current()
+    cached = LATEST.get(per_page)
+    reused = _reuse(cached, call)
+    if reused is not None:
+        return reused
+    if not BUCKET.take():
+        raise RateLimited(f"Qiita rate limit exhausted until {BUCKET.reset_at:.0f}")
+    if call is not None:
+        call.cache = "miss"
+    try:
+        data = _fetch(per_page, max_bytes, dict(headers or {}))
+    except Exception:
+        if not cached:
+            raise
+        # 取得できなければ古い結果を返す
+        LOGGER.error(f"{traceback.format_exc()}")
+        return _fallback(cached, call)
+    LATEST[per_page] = (time.time(), data)
+    return data
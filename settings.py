@@ -0,0 +1,62 @@
+"""定期実行の設定(users テーブルのソースごとの ON/OFF).
+
+設定画面(teiki)と切り替えのコマンド(「1有効」など)は SETTINGS の表で組み立てる。
+設定画面のメッセージは ON/OFF の組み合わせごとに JSON にしたものを使い回し、
+切り替えた後は確認の文言と一緒に更新後の設定画面を返す(もう一度「定期確認」しなくて済む)。
+"""
+
+import functools
+import json
+
+from message import create_content2, create_footer, create_header, create_message
+
+# (コマンドの接頭辞, users テーブルの属性, 名前)
+SETTINGS = [
+    ("定期", "enabled", "定期実行"),
+    ("1", "ait_enabled", "アットマークITランキング"),
+    ("2", "ait_new_all_enabled", "アットマークITの全フォーラムの新着記事"),
+    ("3", "smart_jp_enabled", "スマートジャパンの新着記事"),
+    ("4", "itmedia_news_enabled", "ITmedia NEWS 最新記事一覧"),
+    ("5", "zdjapan_enabled", "ZDNet Japan 最新情報 総合"),
+    ("6", "uxmilk", "UX MILK の最新ニュース"),
+    ("7", "techTarget", "TechTarget Japanの最新記事一覧"),
+]
+ENABLE = "有効"
+DISABLE = "無効"
+FOOTER = """\
+定期実行が無効の場合、有効なものがあってもプッシュ通知されません。
+定期実行が有効の場合、JPCERTの最新情報はオフにできません。
+タップすると有効・無効を切り替えます。"""
+
+
+def parse(command: str) -> tuple[str, str, bool] | None:
+    """切り替えのコマンドなら (属性, 名前, 有効にするか) を返す. それ以外は None."""
+    for prefix, attribute, name in SETTINGS:
+        if command == prefix + ENABLE:
+            return attribute, name, True
+        if command == prefix + DISABLE:
+            return attribute, name, False
+    return None
+
+
+def states(item: dict | None) -> tuple[bool, ...]:
+    """users テーブルの項目から、SETTINGS の順に ON/OFF を返す. ユーザーがいなければ空."""
+    if not item:
+        return ()
+    return tuple(bool(item.get(attribute, {}).get("BOOL", False)) for _, attribute, _ in SETTINGS)
+
+
+@functools.lru_cache(maxsize=2 ** len(SETTINGS))
+def payload(states: tuple[bool, ...]) -> str:
+    """設定画面のメッセージを作成し、JSONにシリアライズして返す."""
+    header = create_header("定期実行の確認", None)
+    contents = []
+    for (prefix, _, name), enabled in zip(SETTINGS, states):
+        label = name if not prefix.isdigit() else f"({prefix}){name}"
+        contents.append(create_content2(label, enabled, prefix + (DISABLE if enabled else ENABLE)))
+    return json.dumps(create_message(header, contents, create_footer(FOOTER)), ensure_ascii=False)
+
+
+def toggled(name: str, enabled: bool) -> dict:
+    """切り替えた後の確認の文言."""
+    return {"type": "text", "text": f"{name}を{ENABLE if enabled else DISABLE}にしました"}
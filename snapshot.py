@@ -0,0 +1,186 @@
+"""取得済みのソースの結果(スナップショット).
+
+返信のたびに外部サイトを取得するとユーザーを待たせ、定期実行も同じものを別に取得している。
+そこで数分ごとに refresh で SOURCES をまとめて取得して保存し、返信と定期実行はそれを読む。
+
+- refresh: SOURCES を順に取得し、成功したものだけを保存する。
+  version は取得した時刻(ミリ秒)とし、より新しい version がすでにあれば上書きしない(条件付き書き込み)
+- latest: 保存されている結果を返す。MAX_AGE_SECONDS より古いかなければ None を返すので、呼び出し側でその場で取得する
+  当日・前日で絞り込むソース(DATED)は、取得したときの日本時間の日付(date)が今日でなければ古いものとして扱う
+  (日付が変わった直後に前日のスナップショットを返さない)
+
+読んだ結果はプロセス内にも LOCAL_TTL 秒だけ残す。
+環境変数 snapshot_table を指定すると DynamoDB に保存してコンテナをまたいで共有する(返信は GetItem 1回になる)。
+
+テーブル:
+{
+    "TableName": "source_snapshots",
+    "Item": {
+        "source": {"S": "jpcertAlert"},
+        "version": {"N": "1700000000000"},
+        "items": {"S": "[{\"title\": \"...\", \"link\": \"...\"}, ...]"},
+        "date": {"S": "2023-11-15"},  # 取得したときの日本時間の日付
+        "expires_at": {"N": "1700086400"}  # DynamoDBのTTL属性
+    }
+}
+"""
+
+import datetime
+import json
+import logging
+import os
+import time
+import traceback
+
+import breaker
+import deadline
+import metrics
+from cache import TTLCache
+
+LOGGER = logging.getLogger(name="Lambda")
+
+TABLE_NAME = os.environ.get("snapshot_table", "")
+# これより古いスナップショットは使わない(秒)
+MAX_AGE_SECONDS = float(os.environ.get("snapshot_max_age_seconds", "1800"))
+# DynamoDBから読んだ結果をプロセス内に残す秒数
+LOCAL_TTL = 60
+# DynamoDBに残しておく秒数
+TTL_SECONDS = 60 * 60 * 24
+
+# 引数を取らず、誰が呼んでも結果が同じソース
+SOURCES = [
+    "aitRanking",
+    "aitNewAll",
+    "itmediaNews",
+    "smartJp",
+    "uxmilk",
+    "zdjapan",
+    "techTarget",
+    "jpcertAlert",
+    "jpcertNotice",
+    "weeklyReport",
+    "qiita",
+]
+# 日本時間の日付(当日・前日)で絞り込むソース
+DATED = [name for name in SOURCES if name != "qiita"]
+
+# {ソース名: (version, 記事の配列, 日付)}
+LOCAL = TTLCache(maxsize=len(SOURCES), ttl=LOCAL_TTL)
+# DynamoDBクライアントを返す関数(attach で設定する)
+_CLIENT = None
+
+
+def attach(client) -> None:
+    """スナップショットの保存に使うDynamoDBクライアントを返す関数を設定する."""
+    global _CLIENT
+    _CLIENT = client
+
+
+def error_code(e: Exception) -> str:
+    """botocoreのClientErrorからエラーコードを取り出す."""
+    return getattr(e, "response", {}).get("Error", {}).get("Code", "")
+
+
+def today() -> str:
+    """日本時間の今日の日付."""
+    return (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=9)).strftime("%Y-%m-%d")
+
+
+def load(name: str) -> tuple[int, list, str] | None:
+    """DynamoDBからスナップショットを読む. なければ None."""
+    if not TABLE_NAME or _CLIENT is None:
+        return None
+    try:
+        item = _CLIENT().get_item(TableName=TABLE_NAME, Key={"source": {"S": name}}).get("Item")
+    except Exception:
+        LOGGER.error(f"{traceback.format_exc()}")
+        return None
+    if not item:
+        return None
+    return int(item["version"]["N"]), json.loads(item["items"]["S"]), item.get("date", {}).get("S", "")
+
+
+def save(name: str, version: int, items: list, date: str) -> None:
+    """スナップショットをDynamoDBに書く. より新しい version があれば書かない.
+
+    date は取得に使った日本時間の日付(Actions.NOW)。
+    """
+    LOCAL.put(name, (version, items, date))
+    if not TABLE_NAME or _CLIENT is None:
+        return
+    param = {
+        "TableName": TABLE_NAME,
+        "Item": {
+            "source": {"S": name},
+            "version": {"N": str(version)},
+            "items": {"S": json.dumps(items, ensure_ascii=False)},
+            "date": {"S": date},
+            "expires_at": {"N": str(int(time.time()) + TTL_SECONDS)},
+        },
+        "ConditionExpression": "attribute_not_exists(#version) OR #version < :version",
+        "ExpressionAttributeNames": {"#version": "version"},
+        "ExpressionAttributeValues": {":version": {"N": str(version)}},
+    }
+    try:
+        _CLIENT().put_item(**param)
+    except Exception as e:
+        if error_code(e) == "ConditionalCheckFailedException":
+            LOGGER.info(f"[SNAPSHOT] {name} newer version exists, skipped {version}")
+            return
+        LOGGER.error(f"{traceback.format_exc()}")
+
+
+def latest(name: str) -> list | None:
+    """ソースの最新のスナップショットを返す. ないか古すぎる場合は None.
+
+    DATED のソースは、取得した日付が今日でなければ古すぎるものとする。
+    """
+    if name not in SOURCES:
+        return None
+    snapshot = LOCAL.get(name)
+    if snapshot is None:
+        snapshot = load(name)
+        if snapshot is not None:
+            LOCAL.put(name, snapshot)
+    dimensions = {"Source": name}
+    age = time.time() - snapshot[0] / 1000 if snapshot is not None else None
+    if age is None or age > MAX_AGE_SECONDS or (name in DATED and snapshot[2] != today()):
+        metrics.put("SnapshotHit", 0, "Count", dimensions)
+        return None
+    metrics.put("SnapshotHit", 1, "Count", dimensions)
+    metrics.put("SnapshotAge", age, "Seconds", dimensions)
+    return snapshot[1]
+
+
+async def refresh() -> dict:
+    """SOURCES を取得してスナップショットを更新する.
+
+    取得は Actions と同じ(ブレーカー・予算の等分もそのまま)。
+    エラーになったもの、ブレーカーが open で取得しなかったもの、古い結果(stale)は保存しない。
+
+    Returns:
+        dict: {ソース名: 保存した件数}。保存しなかったソースは含まない
+    """
+    import Actions as actions
+
+    # 温まったコンテナでも「当日」「前日」を今の時刻で判定する
+    actions.reset_clock()
+    saved = {}
+    date = actions.NOW.strftime("%Y-%m-%d")
+    for i, name in enumerate(SOURCES):
+        version = int(time.time() * 1000)
+        with deadline.share(len(SOURCES) - i):
+            try:
+                items = await getattr(actions.Actions, name)()
+            except Exception:
+                LOGGER.error(f"{traceback.format_exc()}")
+                continue
+        call = metrics.HISTORY[name][-1]
+        # ブレーカーが open の間は取得していない(代わりの結果か空が返る)
+        if breaker.failed(call) or breaker.get(name).state != breaker.CLOSED or call.cache == "stale":
+            LOGGER.warning(f"[SNAPSHOT] {name} not saved (error: {call.error}, cache: {call.cache})")
+            continue
+        save(name, version, items, date)
+        saved[name] = len(items)
+    LOGGER.info(f"[SNAPSHOT] saved {saved}")
+    return saved
@@ -0,0 +1,67 @@
+"""簡易な空間インデックス.
+
+緯度・経度を一定の大きさの格子に区切り、点をセルごとに登録する。
+近くの点を探すときは、半径にかかるセルだけを見る。
+"""
+
+import math
+
+# 緯度1度あたりの距離(メートル)
+METERS_PER_DEGREE = 111_320
+EARTH_RADIUS = 6_371_000
+
+
+def distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """2点間の距離(メートル)."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+
+
+class GridIndex:
+    """格子状の空間インデックス.
+
+    同じ key で登録し直した場合は上書きする。
+    """
+
+    def __init__(self, cell_meters: float = 500):
+        self.cell = cell_meters / METERS_PER_DEGREE
+        self._cells: dict[tuple[int, int], dict] = {}
+        self._keys: dict = {}
+
+    def _cell_of(self, lat: float, lng: float) -> tuple[int, int]:
+        return math.floor(lat / self.cell), math.floor(lng / self.cell)
+
+    def add(self, key, lat: float, lng: float, item) -> None:
+        """点を登録する."""
+        old = self._keys.get(key)
+        if old is not None:
+            self._cells.get(old, {}).pop(key, None)
+        cell = self._cell_of(lat, lng)
+        self._cells.setdefault(cell, {})[key] = (lat, lng, item)
+        self._keys[key] = cell
+
+    def near(self, lat: float, lng: float, radius: float) -> list:
+        """半径(メートル)以内の点を近い順に返す.
+
+        Returns:
+            list: (距離, item) の配列
+        """
+        d_lat = radius / METERS_PER_DEGREE
+        d_lng = d_lat / max(math.cos(math.radians(lat)), 1e-6)
+        lat_min, lng_min = self._cell_of(lat - d_lat, lng - d_lng)
+        lat_max, lng_max = self._cell_of(lat + d_lat, lng + d_lng)
+        found = []
+        for i in range(lat_min, lat_max + 1):
+            for j in range(lng_min, lng_max + 1):
+                for p_lat, p_lng, item in self._cells.get((i, j), {}).values():
+                    d = distance(lat, lng, p_lat, p_lng)
+                    if d <= radius:
+                        found.append((d, item))
+        found.sort(key=lambda x: x[0])
+        return found
+
+    def __len__(self) -> int:
+        return len(self._keys)
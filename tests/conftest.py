@@ -0,0 +1,13 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope="module")
+def fresh_session():
+    """fakes.install_redirect の向け先がモジュールをまたいで残らないよう、fetch のセッションを作り直す."""
+    import fetch
+
+    original = fetch.session
+    fetch._SESSION = None
+    yield
+    fetch.session = original
+    fetch._SESSION = None
@@ -0,0 +1,56 @@
+"""サーキットブレーカーが open の間の結果の確認."""
+
+import asyncio
+import time
+
+import breaker
+import metrics
+from decos import source
+
+
+def open_breaker(name: str, last_good: list) -> None:
+    guard = breaker.get(name)
+    guard.state = breaker.OPEN
+    guard.opened_at = time.time()
+    guard.last_good = last_good
+    guard.last_good_at = time.time()
+
+
+class Sources:
+    @classmethod
+    @source
+    async def news(cls, *_) -> list:
+        raise AssertionError("open の間は呼ばない")
+
+    @classmethod
+    @source
+    async def search(cls, args: list) -> list:
+        raise AssertionError("open の間は呼ばない")
+
+
+def test_open_breaker_serves_stale_result_without_arguments():
+    open_breaker("news", [{"title": "a", "link": "x"}])
+    assert asyncio.run(Sources.news()) == [{"title": "a", "link": "x"}]
+
+
+def test_open_breaker_does_not_serve_other_query():
+    """検索は別の検索条件の結果を返さない."""
+    open_breaker("search", [{"title": "default", "link": "x"}])
+    assert asyncio.run(Sources.search(["新宿", "カレー"])) == []
+
+
+def test_source_records_error_and_returns_none():
+    """例外は source がログに出して error に残し、None を返す."""
+
+    class Failing:
+        @classmethod
+        @source
+        async def failing(cls, *_) -> list:
+            metrics.received(3)
+            raise ValueError("broken feed")
+
+    assert asyncio.run(Failing.failing()) is None
+    call = metrics.HISTORY["failing"][-1]
+    assert call.error == "ValueError"
+    assert call.items_in == 3
+    assert call.items_out == 0
@@ -0,0 +1,47 @@
+"""コールドスタートの import の確認.
+
+新しいインタプリタで lambda_function を import し、重いパッケージ(bs4・requests・boto3 など)が
+読み込まれていないことを確かめる。
+時間は実行する環境で大きく変わるので見ない(時間の予算は python -m benchmarks.coldstart --budget-ms で確かめる)。
+"""
+
+import os
+import subprocess
+import sys
+
+from benchmarks import coldstart
+
+
+def import_lambda_function() -> dict:
+    """-X importtime 付きで lambda_function を import し、coldstart.check_budget に渡せる形にまとめる."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import lambda_function"],
+        cwd=coldstart.ROOT,
+        env=dict(os.environ, PYTHONPATH=str(coldstart.ROOT)),
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    assert proc.returncode == 0, proc.stderr[-4000:]
+    init = coldstart.parse_importtime("###phase init\n" + proc.stderr)["init"]
+    return {
+        "init": {
+            "loaded": sorted({m.split(".")[0] for m in init["modules"]}),
+            "import_ms": init["total_ms"],
+        }
+    }
+
+
+def test_cold_start_does_not_import_heavy_packages():
+    summary = import_lambda_function()
+    assert "lambda_function" in summary["init"]["loaded"]
+    assert coldstart.check_budget(summary, None) == []
+
+
+def test_check_budget_reports_forbidden_imports():
+    """check_budget が重いパッケージを見逃さないこと."""
+    summary = {"init": {"loaded": ["bs4", "boto3", "lambda_function"], "import_ms": 0.0}}
+    assert coldstart.check_budget(summary, None) == [
+        "bs4 is imported at cold start",
+        "boto3 is imported at cold start",
+    ]
@@ -0,0 +1,60 @@
+"""fetch の確認."""
+
+import collections
+import time
+
+import pytest
+
+import deadline
+import fetch
+import metrics
+
+
+def test_hedge_delay_uses_time_to_first_byte(monkeypatch):
+    """ヘッジの待ち時間は本文の読み込みを含まない、最初の1バイトまでの時間の p95 にする."""
+    monkeypatch.setattr(fetch, "HEDGE", True)
+    history = collections.deque(maxlen=metrics.HISTORY_SIZE)
+    for i in range(fetch.HEDGE_MIN_SAMPLES):
+        call = metrics.SourceCall("hedged")
+        call.first_byte_ms = 100.0 + i
+        call.fetch_ms = 2000.0 + i
+        history.append(call)
+    monkeypatch.setitem(metrics.HISTORY, "hedged", history)
+    delay = fetch.hedge_delay(metrics.SourceCall("hedged"))
+    assert delay is not None
+    assert delay < 0.2
+
+
+class SlowBody:
+    """iter_body に渡す stream=True のレスポンスの代わり."""
+
+    url = "http://localhost/slow"
+    headers: dict = {}
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+    def iter_content(self, chunk_size):
+        yield from self.chunks
+
+
+def test_iter_body_stops_at_deadline():
+    """本文を読んでいる途中で予算を使い切ったら、次の chunk を読まずに打ち切る."""
+    res = SlowBody([b"a" * 10, b"b" * 10, b"c" * 10])
+    token = deadline._DEADLINE.set(time.monotonic() + 60)
+    try:
+        body = fetch.iter_body(res)
+        assert next(body) == b"a" * 10
+        deadline._DEADLINE.set(time.monotonic())
+        with pytest.raises(deadline.DeadlineExceeded):
+            next(body)
+    finally:
+        deadline._DEADLINE.reset(token)
+    assert res.closed
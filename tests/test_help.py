@@ -0,0 +1,22 @@
+"""ヘルプ(メソッド一覧)の確認."""
+
+import json
+
+from Actions import Actions
+from ReplyAction import ITEM, help_payload
+
+
+def test_help_covers_every_item():
+    body = json.loads(help_payload())["contents"]["body"]["contents"]
+    entries = [c for c in body if c["type"] != "separator"]
+    shown = [(c["contents"][0]["text"], c["contents"][1]["text"], c["action"]["data"]) for c in entries]
+    expected = [(v["title"], v["description"], v["name"]) for v in ITEM.values() if "description" in v]
+    assert shown == expected
+
+
+def test_every_source_has_help():
+    """Actions のソースはすべて ITEM にヘルプの説明がある(説明は ITEM だけに書く)."""
+    sources = [name for name in vars(Actions) if not name.startswith("_")]
+    assert sources
+    for name in sources:
+        assert {"name", "must", "title", "description"} <= ITEM[name].keys(), name
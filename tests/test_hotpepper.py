@@ -0,0 +1,97 @@
+"""位置情報での店舗検索の確認."""
+
+import json
+
+import pytest
+
+import hotpepper
+import lambda_function
+import spatial
+from benchmarks import fakes
+
+# 東京駅
+LAT, LNG = 35.681236, 139.767125
+
+
+def shop(i: int, lat: float, lng: float) -> dict:
+    return {"name": f"店舗{i}", "urls": {"pc": f"https://example.com/{i}"}, "lat": lat, "lng": lng}
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """ホットペッパーの API の代わり. 呼ばれた回数を数える."""
+    hotpepper.RESULTS.clear()
+    hotpepper.AREAS.clear()
+    state = {"calls": 0, "shops": [], "available": None}
+
+    def read(url, max_bytes, params=None, headers=None):
+        state["calls"] += 1
+        shops = state["shops"]
+        available = len(shops) if state["available"] is None else state["available"]
+        return json.dumps({"results": {"results_available": available, "shop": shops}}).encode("utf-8")
+
+    monkeypatch.setattr(hotpepper.fetch, "read", read)
+    return state
+
+
+def test_grid_index_near():
+    index = spatial.GridIndex(cell_meters=100)
+    index.add("a", LAT, LNG, "a")
+    index.add("b", LAT + 0.002, LNG, "b")  # 約220m北
+    index.add("c", LAT + 0.02, LNG, "c")  # 約2.2km北
+    assert [item for _, item in index.near(LAT, LNG, 500)] == ["a", "b"]
+    # 登録し直すと前の位置からは消える
+    index.add("a", LAT + 0.02, LNG + 0.0001, "a")
+    assert [item for _, item in index.near(LAT, LNG, 500)] == ["b"]
+    assert len(index) == 3
+
+
+def test_nearby_answers_from_index_when_covered(api):
+    api["shops"] = [shop(1, LAT + 0.003, LNG), shop(2, LAT + 0.001, LNG), shop(3, LAT + 0.05, LNG)]
+    params = {"lat": LAT, "lng": LNG, "range": "3"}
+    first = hotpepper.nearby(params)
+    assert api["calls"] == 1
+    assert [s["title"] for s in first] == ["店舗2", "店舗1", "店舗3"]
+    # すべて取得できたので半径1000mは取得済み. その中に収まる検索は API を呼ばない
+    second = hotpepper.nearby({"lat": LAT + 0.001, "lng": LNG, "range": "1"})
+    assert api["calls"] == 1
+    assert [s["title"] for s in second] == ["店舗2", "店舗1"]
+    # はみ出す検索は API を呼ぶ
+    hotpepper.nearby({"lat": LAT + 0.02, "lng": LNG, "range": "3"})
+    assert api["calls"] == 2
+
+
+def test_coverage_of_truncated_results(api):
+    near, far = shop(1, LAT + 0.001, LNG), shop(2, LAT + 0.003, LNG)
+    api["shops"], api["available"] = [near, far], 10
+    hotpepper.search({"lat": LAT, "lng": LNG, "range": "3"})
+    (area,) = hotpepper.AREAS._data.values()
+    (_, _, radius) = area[1].coverage[0]
+    # 距離順で途中までなら、(geohash のセルの中心から)最も遠い店舗までを取得済みとする
+    _, lat, lng = hotpepper.geohash(LAT, LNG)
+    assert radius == pytest.approx(spatial.distance(lat, lng, far["lat"], far["lng"]), abs=1)
+    hotpepper.AREAS.clear()
+    hotpepper.RESULTS.clear()
+    # 距離順でなければ取得済みの範囲はわからない
+    hotpepper.search({"lat": LAT, "lng": LNG, "range": "3", "order": "4"})
+    (area,) = hotpepper.AREAS._data.values()
+    assert area[1].coverage == []
+
+
+def test_location_offers_both_searches():
+    """位置情報にはランチと居酒屋のどちらで検索するかを選ぶメッセージを返す(時刻では決めない)."""
+    choice = lambda_function.location_choice({"latitude": LAT, "longitude": LNG, "address": "東京駅"})
+    body = choice["contents"]["body"]["contents"]
+    postbacks = [c["action"]["data"] for c in body if c.get("action")]
+    assert postbacks == ["ランチ検索 @35.681236,139.767125", "居酒屋検索 @35.681236,139.767125"]
+    # ポストバックの引数は検索で座標として読める
+    assert hotpepper.location(postbacks[0].split(" ")[1:]) == ([], (LAT, LNG))
+
+
+def test_location_message_replies_choice(monkeypatch):
+    replies = []
+    monkeypatch.setattr(lambda_function, "reply", replies.append)
+    location = {"type": "location", "latitude": LAT, "longitude": LNG}
+    body = {"events": [fakes.line_event("message", message=location)]}
+    lambda_function.dispatch({}, body)
+    assert replies == [lambda_function.location_choice(location)]
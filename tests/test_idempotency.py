@@ -0,0 +1,68 @@
+"""Webhookイベントの重複排除の確認."""
+
+import time
+
+import pytest
+
+import idempotency
+from benchmarks import fakes
+
+
+@pytest.fixture
+def dynamo(monkeypatch):
+    monkeypatch.setattr(idempotency, "TABLE_NAME", "webhook_events")
+    idempotency.SEEN.clear()
+    return fakes.FakeDynamo()
+
+
+def event(event_id: str = "01TEST") -> dict:
+    return {"webhookEventId": event_id}
+
+
+def test_duplicate_is_dropped(dynamo):
+    assert idempotency.claim(dynamo, event())
+    idempotency.complete(dynamo, event())
+    idempotency.SEEN.clear()
+    assert not idempotency.claim(dynamo, event())
+
+
+def test_released_event_can_be_retried(dynamo):
+    assert idempotency.claim(dynamo, event())
+    idempotency.release(dynamo, event())
+    assert idempotency.claim(dynamo, event())
+
+
+def test_expired_lease_can_be_retried(dynamo):
+    """処理中に落ちて release できなかったイベントも、期限が切れれば処理し直せる."""
+    assert idempotency.claim(dynamo, event())
+    idempotency.SEEN.clear()
+    item = dynamo.tables[idempotency.TABLE_NAME]["01TEST"]
+    item["expires_at"]["N"] = str(int(time.time()) - 1)
+    assert idempotency.claim(dynamo, event())
+
+
+def test_failed_handler_releases_claim(dynamo, monkeypatch):
+    import lambda_function
+
+    monkeypatch.setattr(lambda_function, "_DYNAMO", dynamo)
+
+    def fail(*_):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(lambda_function, "dispatch", fail)
+    request = fakes.webhook_event(fakes.text_event("コマンド"))
+    with pytest.raises(RuntimeError):
+        lambda_function.handle(request, None)
+    assert not dynamo.tables.get(idempotency.TABLE_NAME)
+    assert len(idempotency.SEEN) == 0
+
+
+def test_memory_only_without_table(monkeypatch):
+    """テーブル名を指定しなければDynamoDBは使わず、コンテナ内だけで判定する."""
+    monkeypatch.setattr(idempotency, "TABLE_NAME", "")
+    idempotency.SEEN.clear()
+    dynamo = fakes.FakeDynamo()
+    assert idempotency.claim(dynamo, event())
+    idempotency.complete(dynamo, event())
+    assert not idempotency.claim(dynamo, event())
+    assert dynamo.tables == {}
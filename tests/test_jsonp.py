@@ -0,0 +1,53 @@
+"""JSONP の解析の確認."""
+
+from pathlib import Path
+
+import pytest
+
+import jsonp
+
+FIXTURE = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures" / "ait_ranking.js"
+
+
+def test_recorded_ranking():
+    body = FIXTURE.read_bytes()
+    data = jsonp.parse(body, "cp932")["data"]
+    items = [item for item in data if item]
+    assert len(items) == 20
+    assert items[0] == {
+        "rank": "1",
+        "title": "AWSの始め方",
+        "link": "https://atmarkit.itmedia.co.jp/ait/articles/2610/10/news100.html",
+        "forum": "Cloud",
+        "date": "%%DATE:-0%%",
+    }
+    assert items[-1]["title"] == "量子コンピュータ、現場の本音"
+
+
+def test_payload_cuts_first_to_last_parenthesis():
+    body = b"rankingindex({'title':'a (b) c'});\n"
+    assert jsonp.payload(body) == b"{'title':'a (b) c'}"
+    with pytest.raises(jsonp.JSONPError):
+        jsonp.payload(b"{'title':'no callback'}")
+
+
+@pytest.mark.parametrize(
+    "title, expected",
+    [
+        (r"'入れ子の(括弧(です))'", "入れ子の(括弧(です))"),
+        (r"'It\'s'", "It's"),
+        (r"'It\x27s'", "It's"),
+        (r"'\x41BC'", "ABC"),
+        (r"'\x4'", "x4"),
+        (r"'a\vb\0c'", "a\vb\0c"),
+        (r"'あ'", "あ"),
+        ("'line\\\ncontinued'", "linecontinued"),
+        (r"'say \"hi\" and \q'", 'say "hi" and q'),
+        (r'"double \'quoted\' \x41"', "double 'quoted' A"),
+        (r"'末尾の括弧)'", "末尾の括弧)"),
+    ],
+)
+def test_adversarial_titles(title, expected):
+    body = f"rankingindex({{data: [{{'title': {title}, 'link': 'https://example.com/'}},],}})".encode("cp932")
+    data = jsonp.parse(body, "cp932")["data"]
+    assert data == [{"title": expected, "link": "https://example.com/"}]
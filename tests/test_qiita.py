@@ -0,0 +1,40 @@
+"""Qiita API クライアントの確認."""
+
+import json
+
+import pytest
+
+import qiita
+from benchmarks import fakes
+
+ERROR = json.dumps({"message": "Rate limit exceeded", "type": "forbidden"}).encode("utf-8")
+
+
+@pytest.fixture(scope="module")
+def local():
+    with fakes.LocalServer() as server:
+        fakes.install_redirect(server)
+        yield server
+
+
+@pytest.fixture
+def server(local):
+    qiita.LATEST.clear()
+    qiita.BUCKET = qiita.TokenBucket(60)
+    yield local
+    qiita.LATEST.clear()
+
+
+def test_error_response_is_not_cached(server):
+    server.add("qiita.com", "/api/v2/items", fakes.Response(403, ERROR, {"Content-Type": "application/json"}))
+    with pytest.raises(RuntimeError):
+        qiita.items(3)
+    assert not qiita.LATEST
+
+
+def test_error_response_serves_previous_items(server):
+    items = [{"title": "a", "url": "https://qiita.com/a"}]
+    qiita.LATEST[3] = (0.0, items)
+    server.add("qiita.com", "/api/v2/items", fakes.Response(403, ERROR, {"Content-Type": "application/json"}))
+    assert qiita.items(3) == items
+    assert qiita.LATEST[3] == (0.0, items)
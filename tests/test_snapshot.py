@@ -0,0 +1,69 @@
+"""スナップショットの確認."""
+
+import time
+
+import pytest
+
+import snapshot
+from benchmarks import fakes
+
+ITEMS = [{"title": "title", "link": "https://example.com/"}]
+
+
+@pytest.fixture
+def dynamo(monkeypatch):
+    snapshot.LOCAL.clear()
+    dynamo = fakes.FakeDynamo()
+    monkeypatch.setattr(snapshot, "TABLE_NAME", "source_snapshots")
+    monkeypatch.setattr(snapshot, "_CLIENT", lambda: dynamo)
+    yield dynamo
+    snapshot.LOCAL.clear()
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def test_local(monkeypatch):
+    monkeypatch.setattr(snapshot, "TABLE_NAME", "")
+    snapshot.LOCAL.clear()
+    snapshot.save("jpcertAlert", now_ms(), ITEMS, snapshot.today())
+    assert snapshot.latest("jpcertAlert") == ITEMS
+    # 引数を取るソースはスナップショットを使わない
+    assert snapshot.latest("lunch") is None
+
+
+def test_dynamodb(dynamo):
+    snapshot.save("jpcertAlert", now_ms(), ITEMS, snapshot.today())
+    snapshot.LOCAL.clear()
+    assert snapshot.latest("jpcertAlert") == ITEMS
+    assert dynamo.calls.get("get_item") == 1
+    # 2回目はプロセス内から返す
+    assert snapshot.latest("jpcertAlert") == ITEMS
+    assert dynamo.calls.get("get_item") == 1
+
+
+def test_older_version_is_not_saved(dynamo):
+    version = now_ms()
+    snapshot.save("jpcertAlert", version, ITEMS, snapshot.today())
+    snapshot.save("jpcertAlert", version - 1, [], snapshot.today())
+    assert dynamo.tables["source_snapshots"]["jpcertAlert"]["version"]["N"] == str(version)
+
+
+def test_stale_by_age(dynamo):
+    old = now_ms() - int((snapshot.MAX_AGE_SECONDS + 60) * 1000)
+    snapshot.save("jpcertAlert", old, ITEMS, snapshot.today())
+    assert snapshot.latest("jpcertAlert") is None
+
+
+def test_stale_by_date(dynamo):
+    """日付が変わったら、日付で絞り込むソースは前日のスナップショットを使わない."""
+    for name in ("jpcertNotice", "weeklyReport", "qiita"):
+        snapshot.save(name, now_ms(), ITEMS, "2000-01-01")
+    assert snapshot.latest("jpcertNotice") is None
+    assert snapshot.latest("weeklyReport") is None
+    assert snapshot.latest("qiita") == ITEMS
+    # date のない古い形式の項目も同じ
+    dynamo.tables["source_snapshots"]["jpcertNotice"].pop("date")
+    snapshot.LOCAL.clear()
+    assert snapshot.latest("jpcertNotice") is None
@@ -0,0 +1,78 @@
+"""記録済みのレスポンス(benchmarks/fixtures)を使った Actions のソースの確認."""
+
+import asyncio
+
+import pytest
+
+from benchmarks import fakes
+
+
+@pytest.fixture(scope="module")
+def server():
+    with fakes.LocalServer() as server:
+        fakes.serve_fixtures(server)
+        fakes.install_redirect(server)
+        yield server
+
+
+def run(name: str) -> list:
+    from Actions import Actions
+
+    return asyncio.run(getattr(Actions, name)())
+
+
+def test_shift_jis_declared_rss(server):
+    """XML 宣言が Shift_JIS のフィードも、UTF-8 のフィードと同じ記事を返す."""
+    import charset
+
+    charset.CACHE.clear()
+    sjis = run("smartJp")
+    utf8 = run("aitNewAll")
+    assert sjis
+    assert [c["title"] for c in sjis] == [c["title"] for c in utf8]
+
+
+def test_weekly_report_uses_first_contents(server):
+    """Weekly Report の目次は最初の div.contents の li だけにする."""
+    import Actions
+
+    today = Actions.NOW.strftime("%Y-%m-%d")
+    html = f"""<html><body>
+<div class="container"><h3>JPCERT/CC WEEKLY REPORT</h3>
+<a class="fl" href="/wr/2026/wr264101.html">{today}号</a>
+<div class="contents"><ul><li>one</li><li>two</li></ul></div>
+</div>
+<div class="contents"><ul><li>other</li></ul></div>
+</body></html>""".encode("utf-8")
+    server.add("www.jpcert.or.jp", "/", fakes.Response(200, html, {"Content-Type": "text/html; charset=utf-8"}))
+    try:
+        contents = run("weeklyReport")
+    finally:
+        fakes.serve_fixtures(server)
+    assert [c["title"] for c in contents] == ["1. one", "2. two"]
+
+
+@pytest.mark.parametrize("reorder", [False, True])
+def test_strained_jpcert_matches_full_parse(reorder):
+    """div.container だけを解析しても、ページ全体を解析した場合と同じ div.container になる."""
+    import Actions
+    import css
+
+    html = fakes.render_fixture("jpcert.html").decode("utf-8")
+    if reorder:
+        # 属性の順番が変わったり class が増えたりしても同じ
+        html = html.replace('<div class="container">', '<div id="main" class="wide container">')
+    strained = css.CONTAINER.select(Actions.parse_html(html, Actions.JPCERT_CONTAINER))
+    full = css.CONTAINER.select(Actions.parse_html(html))
+    assert len(strained) == 4
+    assert [str(c) for c in strained] == [str(c) for c in full]
+
+
+def test_streamed_items_are_counted(server):
+    """ストリームで読んだ item の数は iter_items が items_in に数える."""
+    import metrics
+
+    contents = run("zdjapan")
+    call = metrics.HISTORY["zdjapan"][-1]
+    assert call.items_in == 25
+    assert call.items_out == len(contents)
@@ -0,0 +1,72 @@
+"""users テーブルの更新と定期実行の確認."""
+
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import CronAction as cron
+import decos
+import lambda_function
+import snapshot
+from benchmarks import fakes
+
+
+def test_update_user_seeds_missing_row(monkeypatch):
+    """follow していないユーザーの切り替えでも、定期実行は無効の状態で行を作る."""
+    dynamo = fakes.FakeDynamo()
+    monkeypatch.setattr(lambda_function, "_DYNAMO", dynamo)
+    item = lambda_function.update_user("Unew", {"ait_enabled": {"BOOL": True}})
+    assert item == {"user_id": {"S": "Unew"}, "enabled": {"BOOL": False}, "ait_enabled": {"BOOL": True}}
+    assert dynamo.tables["users"]["Unew"] == item
+
+
+def test_cron_skips_rows_without_enabled(monkeypatch):
+    """enabled のない行があっても、他のユーザーへの配信は止まらない."""
+    dynamo = fakes.FakeDynamo()
+    dynamo.put_item(TableName="users", Item={"user_id": {"S": "Upartial"}, "ait_enabled": {"BOOL": True}})
+    dynamo.put_item(
+        TableName="users",
+        Item={"user_id": {"S": "Uenabled"}, "enabled": {"BOOL": True}, "ait_enabled": {"BOOL": True}},
+    )
+    item = {"title": "title", "link": "https://example.com/"}
+    monkeypatch.setattr(snapshot, "latest", lambda name: [item])
+    pushed = []
+    monkeypatch.setattr(cron, "push", lambda user_list, message: pushed.extend(user_list))
+    asyncio.run(cron.CronAction(dynamo).execute())
+    assert pushed == ["Uenabled"]
+
+
+def test_push_logs_only_size_unless_sampled(monkeypatch, caplog):
+    """送信先のIDとメッセージ全体は、サンプリングしない限りログに出さない."""
+    monkeypatch.setenv("access_token", "test-token")
+    res = SimpleNamespace(status_code=200, headers={}, content=b"{}")
+    monkeypatch.setattr(cron.fetch, "post", lambda *args, **kwargs: res)
+    monkeypatch.setattr(decos, "LOG_SAMPLE_RATE", 0.0)
+    with caplog.at_level(logging.INFO, logger="Lambda"):
+        cron.push(["Usecret"], {"type": "text", "text": "hello"})
+    assert "multicast to 1 users" in caplog.text
+    assert "Usecret" not in caplog.text
+    monkeypatch.setattr(decos, "LOG_SAMPLE_RATE", 1.0)
+    with caplog.at_level(logging.INFO, logger="Lambda"):
+        cron.push(["Usecret"], {"type": "text", "text": "hello"})
+    assert "[SAMPLED] push param" in caplog.text
+
+
+def test_cron_reads_every_scan_page(monkeypatch):
+    """scan が1MBで区切られても、2ページ目以降のユーザーにも配信する."""
+    dynamo = fakes.FakeDynamo()
+    monkeypatch.setattr(dynamo, "SCAN_PAGE_BYTES", 200)
+    users = [f"U{i:04d}" for i in range(10)]
+    for user_id in users:
+        dynamo.put_item(
+            TableName="users",
+            Item={"user_id": {"S": user_id}, "enabled": {"BOOL": True}, "ait_enabled": {"BOOL": True}},
+        )
+    assert "LastEvaluatedKey" in dynamo.scan(TableName="users")
+    item = {"title": "title", "link": "https://example.com/"}
+    monkeypatch.setattr(snapshot, "latest", lambda name: [item])
+    pushed = []
+    monkeypatch.setattr(cron, "push", lambda user_list, message: pushed.extend(user_list))
+    asyncio.run(cron.CronAction(dynamo).execute())
+    assert pushed == users
+    assert dynamo.calls["scan"] > 2
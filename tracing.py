@@ -0,0 +1,235 @@
+"""簡易トレース.
+
+lambda_handler の1回の実行の中で、入れ子になったスパンの時間を記録する。
+環境変数 tracing でエクスポーターを指定する(カンマ区切り、未指定なら何もしない)。
+
+- memory: 実行の最後にスパンのツリーと時間をログに出す
+- xray: X-Ray デーモンに UDP でサブセグメントとして送る
+  (Lambda ではアクティブトレースを有効にすると _X_AMZN_TRACE_ID と AWS_XRAY_DAEMON_ADDRESS が設定される)
+
+ツリーでは同じ名前の兄弟スパンをまとめて、回数と合計時間を表示する。
+"""
+
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import socket
+import time
+
+LOGGER = logging.getLogger(name="Lambda")
+
+EXPORTERS = {name.strip() for name in os.environ.get("tracing", "").split(",") if name.strip()}
+# UDP で送れる大きさ(これを超える場合は子を別のドキュメントにする)
+XRAY_MAX_BYTES = 60 * 1024
+
+
+class Span:
+    """スパン1つ分."""
+
+    __slots__ = ("name", "start", "end", "wall_start", "children", "error", "annotations")
+
+    def __init__(self, name: str, annotations: dict | None = None):
+        self.name = name
+        self.start = time.perf_counter()
+        self.wall_start = time.time()
+        self.end = 0.0
+        self.children: list[Span] = []
+        self.error = False
+        self.annotations = annotations or {}
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+
+_CURRENT: contextvars.ContextVar[Span | None] = contextvars.ContextVar("span", default=None)
+
+
+@contextlib.contextmanager
+def span(name: str, **annotations):
+    """スパンを記録する. invocation の外では何もしない."""
+    parent = _CURRENT.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, annotations)
+    parent.children.append(child)
+    token = _CURRENT.set(child)
+    try:
+        yield child
+    except BaseException:
+        child.error = True
+        raise
+    finally:
+        child.end = time.perf_counter()
+        _CURRENT.reset(token)
+
+
+def traced(name: str | None = None):
+    """関数をスパンで囲むデコレーター."""
+
+    def traced_wrapper(func):
+        label = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(label):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _CURRENT.get() is None:
+                return func(*args, **kwargs)
+            with span(label):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return traced_wrapper
+
+
+class TracedClient:
+    """boto3 のクライアントなどの呼び出しをスパンで囲むラッパー."""
+
+    def __init__(self, client, prefix: str):
+        self._client = client
+        self._prefix = prefix
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._client, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+        label = f"{self._prefix}.{name}"
+
+        @functools.wraps(attr)
+        def wrapper(*args, **kwargs):
+            with span(label, table=kwargs.get("TableName", "")):
+                return attr(*args, **kwargs)
+
+        return wrapper
+
+
+@contextlib.contextmanager
+def invocation(name: str):
+    """1回の実行のルートスパン. 抜けるときにエクスポートする."""
+    if not EXPORTERS:
+        yield None
+        return
+    root = Span(name)
+    token = _CURRENT.set(root)
+    try:
+        yield root
+    except BaseException:
+        root.error = True
+        raise
+    finally:
+        root.end = time.perf_counter()
+        _CURRENT.reset(token)
+        export(root)
+
+
+def export(root: Span) -> None:
+    try:
+        if "memory" in EXPORTERS:
+            LOGGER.info("[TRACE]\n" + render(root))
+        if "xray" in EXPORTERS:
+            send_xray(root)
+    except Exception:
+        LOGGER.exception("[TRACE] export failed")
+
+
+def render(root: Span) -> str:
+    """スパンのツリーをフレームグラフ風の文字列にする."""
+    lines: list[tuple[str, float, int]] = []
+    total = root.duration_ms or 1.0
+
+    def walk(spans: list, prefix: str) -> None:
+        # 同じ名前の兄弟はまとめる
+        groups: dict[str, list] = {}
+        for s in spans:
+            groups.setdefault(s.name, []).append(s)
+        names = list(groups)
+        for i, group_name in enumerate(names):
+            group = groups[group_name]
+            last = i == len(names) - 1
+            label = f"{prefix}{'└─ ' if last else '├─ '}{group_name}"
+            if len(group) > 1:
+                label += f" ×{len(group)}"
+            if any(s.error for s in group):
+                label += " !"
+            lines.append((label, sum(s.duration_ms for s in group), len(group)))
+            walk([c for s in group for c in s.children], prefix + ("   " if last else "│  "))
+
+    lines.append((root.name + (" !" if root.error else ""), root.duration_ms, 1))
+    walk(root.children, "")
+    width = max(len(label) for label, _, _ in lines) + 2
+    out = []
+    for label, ms, _ in lines:
+        bar = "█" * max(1, round(ms / total * 30))
+        out.append(f"{label:<{width}}{ms:>10.1f}ms {bar}")
+    return "\n".join(out)
+
+
+def _trace_header() -> dict:
+    """_X_AMZN_TRACE_ID (Root=...;Parent=...;Sampled=1) を辞書にする."""
+    header = {}
+    for part in os.environ.get("_X_AMZN_TRACE_ID", "").split(";"):
+        if "=" in part:
+            key, value = part.split("=", 1)
+            header[key] = value
+    return header
+
+
+def _segment(s: Span, base_wall: float, base: float, with_children: bool = True) -> dict:
+    doc = {
+        "id": os.urandom(8).hex(),
+        "name": s.name,
+        "start_time": base_wall + (s.start - base),
+        "end_time": base_wall + ((s.end or time.perf_counter()) - base),
+    }
+    if s.error:
+        doc["fault"] = True
+    if s.annotations:
+        doc["annotations"] = {k: v for k, v in s.annotations.items() if v not in (None, "")}
+    if with_children and s.children:
+        doc["subsegments"] = [_segment(c, base_wall, base) for c in s.children]
+    return doc
+
+
+def send_xray(root: Span) -> None:
+    """X-Ray デーモンにサブセグメントを送る."""
+    header = _trace_header()
+    if header.get("Sampled") == "0" or "Root" not in header:
+        return
+    host, _, port = os.environ.get("AWS_XRAY_DAEMON_ADDRESS", "127.0.0.1:2000").partition(":")
+    address = (host, int(port or 2000))
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    base_wall, base = root.wall_start, root.start
+
+    def emit(s: Span, parent_id: str) -> None:
+        doc = _segment(s, base_wall, base)
+        doc.update({"type": "subsegment", "trace_id": header["Root"], "parent_id": parent_id})
+        data = json.dumps(doc, ensure_ascii=False).encode("utf-8")
+        if len(data) > XRAY_MAX_BYTES and s.children:
+            # 大きすぎる場合は子を別のドキュメントにする
+            doc = _segment(s, base_wall, base, with_children=False)
+            doc.update({"type": "subsegment", "trace_id": header["Root"], "parent_id": parent_id})
+            data = json.dumps(doc, ensure_ascii=False).encode("utf-8")
+            sock.sendto(b'{"format": "json", "version": 1}\n' + data, address)
+            for child in s.children:
+                emit(child, doc["id"])
+            return
+        sock.sendto(b'{"format": "json", "version": 1}\n' + data, address)
+
+    try:
+        emit(root, header.get("Parent", ""))
+    finally:
+        sock.close()